@@ -0,0 +1,103 @@
+import csv
+import logging
+import requests
+from collections import Counter, defaultdict
+from dataclasses import dataclass, fields
+from urllib3.util.request import ACCEPT_ENCODING
+
+
+logger = logging.getLogger(__file__)
+
+
+# Encodings urllib3 is able to decode: brotli is a dependency, br is still not advertised in vain if it is missing
+ACCEPT_ENCODING = ACCEPT_ENCODING.replace(',', ', ')
+
+
+@dataclass
+class Traffic:
+    requests: int = 0
+    sent_bytes: int = 0  # Request line, headers and body
+    received_bytes: int = 0  # Status line, headers and body as received
+    body_bytes: int = 0  # Body as received, compressed if it is encoded
+    decoded_bytes: int = 0  # Decoded body
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.decoded_bytes / self.body_bytes if self.body_bytes else 0.0
+
+    def __iadd__(self, other: 'Traffic') -> 'Traffic':
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+        return self
+
+
+def _headers_size(headers) -> int:
+    return sum(len(name) + len(value) + 4 for name, value in headers.items())  # "name: value\r\n"
+
+
+class BandwidthMeter:
+    """ Traffic of the responses by proxy and request type: catalog, feed, item, beacon or captcha """
+
+    def __init__(self):
+        self._traffic: dict[tuple[str, str], Traffic] = defaultdict(Traffic)
+        self._encodings: dict[str, Counter] = defaultdict(Counter)  # Content-Encoding of the responses by request type
+
+    def record(self, proxy_id: str, request_type: str, response: requests.Response) -> None:
+        """ Adds traffic of the response which body has been read """
+
+        request = response.request
+        body = request.body or b''
+        body_bytes = response.raw.tell()  # Bytes read from the socket before decoding
+
+        self._traffic[(proxy_id, request_type)] += Traffic(
+            requests=1,
+            sent_bytes=len(f'{request.method} {request.path_url} HTTP/1.1\r\n') + _headers_size(request.headers) +
+            len(body if isinstance(body, bytes) else body.encode()),
+            received_bytes=len(f'HTTP/1.1 {response.status_code} {response.reason}\r\n') +
+            _headers_size(response.headers) + body_bytes,
+            body_bytes=body_bytes,
+            decoded_bytes=len(response.content)
+        )
+        self._encodings[request_type][response.headers.get('content-encoding', 'identity')] += 1
+
+    def totals(self, by: str) -> dict[str, Traffic]:
+        """ Returns traffic summed by 'proxy' or by 'request_type' """
+
+        assert by in ('proxy', 'request_type'), '`by` parameter must be either proxy or request_type'
+
+        totals = defaultdict(Traffic)
+
+        for (proxy_id, request_type), traffic in self._traffic.items():
+            totals[proxy_id if by == 'proxy' else request_type] += traffic
+
+        return dict(totals)
+
+    def log(self, prefix: str) -> None:
+        for request_type, traffic in sorted(self.totals(by='request_type').items()):
+            encodings = ', '.join(f'{encoding} {n}' for encoding, n in self._encodings[request_type].most_common())
+            logger.info(
+                f'{prefix} — {request_type}: {traffic.requests} requests, '
+                f'{(traffic.sent_bytes + traffic.received_bytes) / 1024:.1f} KiB on the wire, '
+                f'{traffic.decoded_bytes / 1024:.1f} KiB decoded, encodings: {encodings}'
+            )
+
+        for proxy_id, traffic in sorted(self.totals(by='proxy').items()):
+            logger.info(
+                f'{prefix} — Proxy {proxy_id}: {(traffic.sent_bytes + traffic.received_bytes) / 1024:.1f} KiB on the wire'
+            )
+
+    def save(self, filename: str, link_id: str) -> None:
+        """ Saves bandwidth report of the run as csv """
+
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(
+                ('link_id', 'proxy_id', 'request_type') + tuple(field.name for field in fields(Traffic)) +
+                ('compression_ratio',)
+            )
+
+            for (proxy_id, request_type), traffic in sorted(self._traffic.items()):
+                writer.writerow(
+                    (link_id, proxy_id, request_type) + tuple(getattr(traffic, field.name) for field in fields(Traffic)) +
+                    (f'{traffic.compression_ratio:.2f}',)
+                )
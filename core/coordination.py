@@ -0,0 +1,338 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+from typing import Generator, Iterable, NamedTuple
+from urllib.parse import urlparse
+from .settings import BASE_DIR
+
+
+logger = logging.getLogger(__file__)
+
+
+class LeaseLost(Exception):
+    """ Raised when the lease has expired and has been claimed by another node """
+
+
+class Lease(NamedTuple):
+    run_id: str
+    link_id: str
+    node_id: str
+    expires_at: float
+    attempts: int
+
+
+class LeaseBackend(ABC):
+    """
+        Storage of links leases shared between nodes.
+        Every link of a run is either pending, claimed by a node until the lease expires, done or failed.
+        A link claimed by a dead node becomes available again as soon as its lease expires.
+    """
+
+    @abstractmethod
+    def register(self, run_id: str, link_ids: Iterable[str]) -> None:
+        """ Adds links to the run, already registered links are left as is """
+
+    @abstractmethod
+    def claim(self, run_id: str, node_id: str, ttl: float, max_attempts: int) -> Lease | None:
+        """ Claims a pending or an expired link for ttl seconds, returns None if there is nothing to claim """
+
+    @abstractmethod
+    def renew(self, lease: Lease, ttl: float) -> Lease:
+        """ Extends the lease for ttl seconds. Raises LeaseLost if the lease is not owned by the node anymore """
+
+    @abstractmethod
+    def complete(self, lease: Lease) -> None:
+        """ Marks the link as done """
+
+    @abstractmethod
+    def release(self, lease: Lease) -> None:
+        """ Returns the link back to pending links to be claimed by any node """
+
+    @abstractmethod
+    def unfinished(self, run_id: str, max_attempts: int) -> int:
+        """ Returns number of links which are not done and still can be claimed """
+
+    @abstractmethod
+    def failed(self, run_id: str, max_attempts: int) -> list[str]:
+        """ Returns ids of links which are not done and have no attempts left """
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """ Leases stored in SQLite database, the database file must be on a volume shared between nodes """
+
+    def __init__(self, filename: str):
+        self._filename = filename
+
+        with self._connect() as connection:
+            connection.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS leases (
+                        run_id TEXT NOT NULL,
+                        link_id TEXT NOT NULL,
+                        state TEXT NOT NULL DEFAULT 'pending',
+                        node_id TEXT,
+                        expires_at REAL NOT NULL DEFAULT 0,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (run_id, link_id)
+                    )
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        # isolation_level=None to control transactions explicitly with BEGIN IMMEDIATE
+        connection = sqlite3.connect(self._filename, timeout=60, isolation_level=None)
+
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def register(self, run_id: str, link_ids: Iterable[str]) -> None:
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO leases (run_id, link_id) VALUES (?, ?)',
+                [(run_id, link_id) for link_id in link_ids]
+            )
+
+    def claim(self, run_id: str, node_id: str, ttl: float, max_attempts: int) -> Lease | None:
+        now = time.time()
+
+        with self._connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')  # Lock the database for writing until commit
+            row = connection.execute(
+                """
+                    SELECT link_id, attempts FROM leases
+                    WHERE run_id = ? AND attempts < ?
+                        AND (state = 'pending' OR (state = 'claimed' AND expires_at < ?))
+                    ORDER BY attempts, link_id
+                    LIMIT 1
+                """,
+                (run_id, max_attempts, now)
+            ).fetchone()
+
+            if row is None:
+                connection.execute('COMMIT')
+                return
+
+            link_id, attempts = row
+            lease = Lease(run_id=run_id, link_id=link_id, node_id=node_id, expires_at=now + ttl, attempts=attempts + 1)
+
+            connection.execute(
+                """
+                    UPDATE leases SET state = 'claimed', node_id = ?, expires_at = ?, attempts = ?
+                    WHERE run_id = ? AND link_id = ?
+                """,
+                (node_id, lease.expires_at, lease.attempts, run_id, link_id)
+            )
+            connection.execute('COMMIT')
+
+            return lease
+
+    def renew(self, lease: Lease, ttl: float) -> Lease:
+        renewed = lease._replace(expires_at=time.time() + ttl)
+
+        with self._connect() as connection:
+            cursor = connection.execute(
+                """
+                    UPDATE leases SET expires_at = ?
+                    WHERE run_id = ? AND link_id = ? AND state = 'claimed' AND node_id = ? AND attempts = ?
+                """,
+                (renewed.expires_at, lease.run_id, lease.link_id, lease.node_id, lease.attempts)
+            )
+
+        if not cursor.rowcount:
+            raise LeaseLost(f'Lease of link {lease.link_id} has been lost by node {lease.node_id}')
+
+        return renewed
+
+    def _finish(self, lease: Lease, state: str) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                """
+                    UPDATE leases SET state = ?, node_id = NULL, expires_at = 0
+                    WHERE run_id = ? AND link_id = ? AND node_id = ? AND attempts = ?
+                """,
+                (state, lease.run_id, lease.link_id, lease.node_id, lease.attempts)
+            )
+
+    def complete(self, lease: Lease) -> None:
+        self._finish(lease, 'done')
+
+    def release(self, lease: Lease) -> None:
+        self._finish(lease, 'pending')
+
+    def unfinished(self, run_id: str, max_attempts: int) -> int:
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM leases WHERE run_id = ? AND state != 'done' AND attempts < ?",
+                (run_id, max_attempts)
+            ).fetchone()[0]
+
+    def failed(self, run_id: str, max_attempts: int) -> list[str]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT link_id FROM leases WHERE run_id = ? AND state != 'done' AND attempts >= ?",
+                (run_id, max_attempts)
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+
+class MemoryLeaseBackend(LeaseBackend):
+    """ Leases stored in memory, shared between nodes by serve_leases() as a local stand-in server """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases: dict[tuple[str, str], dict] = {}
+
+    def register(self, run_id: str, link_ids: Iterable[str]) -> None:
+        with self._lock:
+            for link_id in link_ids:
+                self._leases.setdefault(
+                    (run_id, link_id),
+                    {'state': 'pending', 'node_id': None, 'expires_at': 0, 'attempts': 0}
+                )
+
+    def claim(self, run_id: str, node_id: str, ttl: float, max_attempts: int) -> Lease | None:
+        now = time.time()
+
+        with self._lock:
+            candidates = [
+                (row['attempts'], link_id) for (_run_id, link_id), row in self._leases.items()
+                if _run_id == run_id and row['attempts'] < max_attempts and (
+                    row['state'] == 'pending' or (row['state'] == 'claimed' and row['expires_at'] < now)
+                )
+            ]
+
+            if not candidates:
+                return
+
+            _, link_id = min(candidates)
+            row = self._leases[(run_id, link_id)]
+            row.update(state='claimed', node_id=node_id, expires_at=now + ttl, attempts=row['attempts'] + 1)
+
+            return Lease(
+                run_id=run_id, link_id=link_id, node_id=node_id, expires_at=row['expires_at'], attempts=row['attempts']
+            )
+
+    def _owned_row(self, lease: Lease) -> dict | None:
+        row = self._leases.get((lease.run_id, lease.link_id))
+
+        if row and row['state'] == 'claimed' and row['node_id'] == lease.node_id \
+                and row['attempts'] == lease.attempts:
+            return row
+
+    def renew(self, lease: Lease, ttl: float) -> Lease:
+        with self._lock:
+            row = self._owned_row(lease)
+
+            if row is None:
+                raise LeaseLost(f'Lease of link {lease.link_id} has been lost by node {lease.node_id}')
+
+            row['expires_at'] = time.time() + ttl
+            return lease._replace(expires_at=row['expires_at'])
+
+    def _finish(self, lease: Lease, state: str) -> None:
+        with self._lock:
+            row = self._owned_row(lease)
+
+            if row is not None:
+                row.update(state=state, node_id=None, expires_at=0)
+
+    def complete(self, lease: Lease) -> None:
+        self._finish(lease, 'done')
+
+    def release(self, lease: Lease) -> None:
+        self._finish(lease, 'pending')
+
+    def unfinished(self, run_id: str, max_attempts: int) -> int:
+        with self._lock:
+            return sum(
+                1 for (_run_id, _), row in self._leases.items()
+                if _run_id == run_id and row['state'] != 'done' and row['attempts'] < max_attempts
+            )
+
+    def failed(self, run_id: str, max_attempts: int) -> list[str]:
+        with self._lock:
+            return [
+                link_id for (_run_id, link_id), row in self._leases.items()
+                if _run_id == run_id and row['state'] != 'done' and row['attempts'] >= max_attempts
+            ]
+
+
+class _LeaseManager(BaseManager):
+    pass
+
+
+def serve_leases(host: str, port: int, authkey: bytes) -> None:
+    """ Serves MemoryLeaseBackend over TCP until the process is stopped """
+
+    backend = MemoryLeaseBackend()
+    _LeaseManager.register('get_backend', callable=lambda: backend)
+
+    manager = _LeaseManager(address=(host, port), authkey=authkey)
+    logger.debug(f'Serving leases on {host}:{port}...')
+    manager.get_server().serve_forever()
+
+
+def get_lease_backend(url: str, authkey: bytes = b'') -> LeaseBackend:
+    """
+        Returns lease backend by its URL:
+            - sqlite:///path/to/leases.sqlite3 — SQLite database (relative paths are relative to BASE_DIR)
+            - manager://host:port — Server started by serve_leases()
+    """
+
+    parsed = urlparse(url)
+
+    match parsed.scheme:
+        case 'sqlite':
+            filename = url[len('sqlite:///'):]
+            return SQLiteLeaseBackend(filename if os.path.isabs(filename) else os.path.join(BASE_DIR, filename))
+        case 'manager':
+            _LeaseManager.register('get_backend')
+            manager = _LeaseManager(address=(parsed.hostname, parsed.port), authkey=authkey)
+            manager.connect()
+            return manager.get_backend()
+        case _:
+            raise ValueError(f'Unknown lease backend {url}')
+
+
+class LeaseKeeper:
+    """ Renews the lease in a background thread while the link is being parsed """
+
+    def __init__(self, backend: LeaseBackend, lease: Lease, ttl: float):
+        self._backend = backend
+        self._lease = lease
+        self._ttl = ttl
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+        self.lost = threading.Event()  # Set when the lease has been claimed by another node
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+
+    @property
+    def lease(self) -> Lease:
+        return self._lease
+
+    def _renew(self) -> None:
+        while not self._stopped.wait(self._ttl / 3):
+            try:
+                self._lease = self._backend.renew(self._lease, self._ttl)
+            except LeaseLost as e:
+                logger.error(e)
+                self.lost.set()
+                return
+            except Exception as e:  # Coordinator is temporarily unavailable, the lease is still valid until ttl
+                logger.exception(f'Lease of link {self._lease.link_id} renewal failed — {e}')
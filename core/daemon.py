@@ -0,0 +1,302 @@
+import fcntl
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+from typing import Callable
+from .link import Link, load_links, parse_schedule
+from .proxy import Proxy, load_proxies
+from .settings import (
+    BASE_DIR,
+    DAEMON_DEFAULT_SCHEDULE,
+    SUPERVISOR_RESTART_BASE_DELAY_IN_SECONDS,
+    SUPERVISOR_RESTART_MAX_DELAY_IN_SECONDS,
+    WORKER_HEARTBEAT_TIMEOUT_IN_SECONDS
+)
+from .supervisor import Heartbeat
+
+
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class LinkState:
+    link: Link
+    next_run_at: float  # Unix timestamp
+    process: Process | None = None
+    heartbeat: Heartbeat | None = None
+    proxy_id: str | None = None
+    started_at: float | None = None
+    finished_at: float | None = None
+    exit_code: int | None = None
+    runs: int = 0
+    failures: int = 0  # Consecutive failed runs
+    is_removed: bool = False  # Has been removed from input/links.csv while running
+
+    @property
+    def interval(self) -> float:
+        return parse_schedule(self.link.schedule or DAEMON_DEFAULT_SCHEDULE)
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.link.id,
+            'schedule': self.link.schedule or DAEMON_DEFAULT_SCHEDULE,
+            'state': 'running' if self.is_running else 'due' if self.next_run_at <= time.time() else 'scheduled',
+            'proxy_id': self.proxy_id,
+            'next_run_at': None if self.is_running else self.next_run_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'exit_code': self.exit_code,
+            'runs': self.runs,
+            'failures': self.failures
+        }
+
+
+def _run_link(target: Callable, link: Link, proxy: Proxy, heartbeat: Heartbeat) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # The handler of the daemon is inherited by the forked process
+    target(link, proxy, heartbeat=heartbeat)
+
+
+class Daemon:
+    """
+        Resident service which runs each link from input/links.csv on its own schedule.
+        Parsers are forked from the running interpreter, so a run does not pay for start-up,
+        and reuse the sessions of their proxies from the session vault.
+        A link is not started again until its previous run has finished, a proxy is used by a single run at a time.
+        input/links.csv and input/proxies.csv are reloaded when they change.
+    """
+
+    def __init__(self, target: Callable, status_address: str | None = None,
+                 heartbeat_timeout: float = WORKER_HEARTBEAT_TIMEOUT_IN_SECONDS):
+        """
+            Args:
+                target: Function to run in the parser process, called as target(link, proxy, heartbeat=heartbeat)
+                status_address: host:port to serve the status of the runs at, the endpoint is disabled if it is empty
+        """
+
+        self._target = target
+        self._status_address = status_address
+        self._heartbeat_timeout = heartbeat_timeout
+        self._links: dict[str, LinkState] = {}
+        self._proxies: tuple[Proxy, ...] = ()
+        self._mtimes: dict[str, float] = {}  # Modification time of the input files when they have been loaded
+        self._lock = threading.Lock()  # State is read by the status endpoint thread
+        self._stopping = threading.Event()
+        self._started_at = time.time()
+
+    def _reload(self) -> None:
+        """ Loads input/links.csv and input/proxies.csv if they have changed, keeps the previous ones if unreadable """
+
+        for name, load in (('links', load_links), ('proxies', load_proxies)):
+            filename = os.path.join(BASE_DIR, f'input/{name}.csv')
+
+            try:
+                mtime = os.path.getmtime(filename)  # The file may be missing for a moment while it is being replaced
+
+                if self._mtimes.get(name) == mtime:
+                    continue
+
+                self._mtimes[name] = mtime
+                loaded = load()
+            except Exception as e:
+                logger.error(f'Daemon — input/{name}.csv has not been reloaded — {e}')
+                continue
+
+            if name == 'proxies':
+                self._proxies = loaded
+                logger.info(f'Daemon — {len(loaded)} proxies loaded')
+                continue
+
+            links = {link.id: link for link in loaded}
+
+            for link_id, state in list(self._links.items()):
+                if link_id not in links:
+                    if state.is_running:  # Is dropped when the run finishes
+                        state.is_removed = True
+                    else:
+                        del self._links[link_id]
+                else:
+                    state.is_removed = False
+
+                    if state.link != links[link_id]:
+                        state.link = links[link_id]
+
+                        if not state.is_running and state.started_at and not state.failures:  # New schedule
+                            state.next_run_at = state.started_at + state.interval
+
+            for link_id, link in links.items():
+                if link_id not in self._links:
+                    self._links[link_id] = LinkState(link=link, next_run_at=time.time())
+
+            logger.info(f'Daemon — {len(links)} links loaded')
+
+    def _start(self, state: LinkState, proxy: Proxy) -> None:
+        state.heartbeat = Heartbeat()
+        state.process = Process(target=_run_link, args=(self._target, state.link, proxy, state.heartbeat))
+        state.process.start()
+        state.proxy_id = proxy.id
+        state.started_at = time.time()
+        state.runs += 1
+
+        logger.info(f'Daemon — Started link {state.link.id} with proxy {proxy.id}, pid {state.process.pid}')
+
+    def _check(self, state: LinkState) -> None:
+        """ Collects the finished run of the link and schedules the next one """
+
+        if state.process.is_alive():
+            if state.heartbeat.seconds_since() <= self._heartbeat_timeout:
+                return
+
+            logger.error(f'Daemon — Link {state.link.id} has no heartbeat for {self._heartbeat_timeout:.0f}s')
+            state.process.kill()
+
+        state.process.join()
+        state.exit_code = state.process.exitcode
+        state.finished_at = time.time()
+        state.process = None
+        state.heartbeat = None
+
+        if state.exit_code == 0:
+            state.failures = 0
+            state.next_run_at = state.started_at + state.interval
+            logger.info(f'Daemon — Link {state.link.id} finished, next run in {state.next_run_at - time.time():.0f}s')
+        else:
+            # Failed run is retried earlier than the schedule, continuing from its checkpoint
+            state.failures += 1
+            delay = min(
+                SUPERVISOR_RESTART_BASE_DELAY_IN_SECONDS * 2 ** (state.failures - 1),
+                SUPERVISOR_RESTART_MAX_DELAY_IN_SECONDS,
+                state.interval
+            )
+            state.next_run_at = time.time() + delay
+            logger.warning(
+                f'Daemon — Link {state.link.id} failed with exit code {state.exit_code}, next run in {delay:.0f}s'
+            )
+
+        if state.is_removed:
+            del self._links[state.link.id]
+
+    def _tick(self) -> None:
+        self._reload()
+
+        for state in list(self._links.values()):
+            if state.is_running:
+                self._check(state)
+
+        in_use = {state.proxy_id for state in self._links.values() if state.is_running}
+        free = [proxy for proxy in self._proxies if proxy.id not in in_use]
+        due = sorted(
+            (state for state in self._links.values() if not state.is_running and state.next_run_at <= time.time()),
+            key=lambda state: state.next_run_at
+        )
+
+        for state, proxy in zip(due, free):
+            self._start(state, proxy)
+
+    def status(self) -> dict:
+        """ Returns state of the links, number of the running ones and of the due ones waiting for a free proxy """
+
+        with self._lock:
+            links = [state.to_dict() for state in self._links.values()]
+
+        return {
+            'started_at': self._started_at,
+            'running': sum(link['state'] == 'running' for link in links),
+            'queue_depth': sum(link['state'] == 'due' for link in links),
+            'proxies': len(self._proxies),
+            'links': links
+        }
+
+    def _serve_status(self) -> ThreadingHTTPServer:
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/status'):
+                    self.send_error(404)
+                    return
+
+                body = json.dumps(daemon.status()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f'Daemon — Status request: {format % args}')
+
+        host, port = self._status_address.rsplit(':', 1)
+        server = ThreadingHTTPServer((host, int(port)), StatusHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        logger.info(f'Daemon — Serving status on http://{self._status_address}/status')
+
+        return server
+
+    def _stop_runs(self, interrupt: bool, timeout: float = 60) -> None:
+        """
+            Waits for the running parsers to save their checkpoints and kills them after the timeout.
+            Args:
+                interrupt: Interrupt the parsers, they have been interrupted by Ctrl+C along with the daemon otherwise
+        """
+
+        running = [state for state in self._links.values() if state.is_running]
+
+        if interrupt:
+            for state in running:
+                os.kill(state.process.pid, signal.SIGINT)
+
+        for state in running:
+            state.process.join(timeout)
+
+            if state.process.is_alive():
+                state.process.kill()
+                state.process.join()
+
+            logger.info(f'Daemon — Link {state.link.id} stopped with exit code {state.process.exitcode}')
+
+    def run(self, interval: float = 1) -> None:
+        """ Runs the links until SIGTERM or SIGINT """
+
+        # Prevents a second daemon from running the same links at the same time
+        os.makedirs(os.path.join(BASE_DIR, 'tmp'), exist_ok=True)
+        lock = open(os.path.join(BASE_DIR, 'tmp/daemon.lock'), 'w')
+
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise RuntimeError('Another daemon is already running') from None
+
+        signal.signal(signal.SIGTERM, lambda *_: self._stopping.set())
+        server = self._serve_status() if self._status_address else None
+        is_interrupted = False
+
+        try:
+            while not self._stopping.is_set():
+                with self._lock:
+                    self._tick()
+
+                self._stopping.wait(interval)
+        except KeyboardInterrupt:
+            is_interrupted = True
+        finally:
+            logger.info('Daemon — Stopping...')
+
+            if server is not None:
+                server.shutdown()
+
+            with self._lock:
+                self._stop_runs(interrupt=not is_interrupted)
+
+            lock.close()
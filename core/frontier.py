@@ -0,0 +1,203 @@
+import os
+import sqlite3
+from typing import Generator, Iterable
+
+
+class Frontier:
+    """
+        Disk-backed frontier of catalog item links.
+        Items are stored, deduplicated by item id, ordered and iterated in SQLite,
+        so only the current item is kept in memory whatever the size of the catalog is.
+        Records parsed from the items are not stored here, they are kept by the parser for the output.
+        Items are visited in the order set by set_order(), the cursor is persisted by save_cursor()
+        together with the records parsed so far to continue from the same place after restart.
+    """
+
+    def __init__(self, filename: str):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        self._connection = sqlite3.connect(filename)
+        self._connection.executescript(
+            """
+                CREATE TABLE IF NOT EXISTS items (
+                    position INTEGER PRIMARY KEY,  -- Position in catalog starting from 0
+                    item_id INTEGER NOT NULL UNIQUE,
+                    path TEXT NOT NULL,
+                    card_fingerprint TEXT  -- Fingerprint of the catalog card in listing-only mode
+                );
+                CREATE TABLE IF NOT EXISTS visit_order (
+                    rank INTEGER PRIMARY KEY,
+                    position INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """
+        )
+        self._connection.commit()
+
+        self._cursor = self._get_state('cursor')
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _get_state(self, key: str, default: int = 0) -> int:
+        row = self._connection.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, key: str, value: int) -> None:
+        self._connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?)', (key, value))
+        self._connection.commit()
+
+    @property
+    def is_complete(self) -> bool:
+        """ Returns True if all the catalog links have been added """
+
+        return bool(self._get_state('complete'))
+
+    @property
+    def is_full_listing(self) -> bool:
+        """ Returns True if the links have been collected from all the pages of the catalog """
+
+        return bool(self._get_state('full_listing', 1))
+
+    def mark_complete(self, is_full_listing: bool = True) -> None:
+        self._set_state('full_listing', int(is_full_listing))
+        self._set_state('complete', 1)
+
+    def clear(self) -> None:
+        """ Removes all the items, the order and the cursor """
+
+        self._connection.executescript('DELETE FROM items; DELETE FROM visit_order; DELETE FROM state;')
+        self._connection.commit()
+        self._cursor = 0
+
+    def extend(self, item_links: Iterable[tuple[str, str, str | None]]) -> int:
+        """
+            Adds (item id, path, card fingerprint) to the end of the frontier,
+            returns number of items which were not there
+        """
+
+        added = 0
+
+        for item_id, path, card_fingerprint in item_links:
+            cursor = self._connection.execute(
+                """
+                    INSERT OR IGNORE INTO items (position, item_id, path, card_fingerprint)
+                    VALUES ((SELECT COALESCE(MAX(position) + 1, 0) FROM items), ?, ?, ?)
+                """,
+                (int(item_id), path, card_fingerprint)
+            )
+            added += cursor.rowcount
+
+        self._connection.commit()
+
+        return added
+
+    def __contains__(self, item_id: str) -> bool:
+        return self._connection.execute(
+            'SELECT 1 FROM items WHERE item_id = ?', (int(item_id),)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def position_of(self, item_id: str) -> int | None:
+        """ Returns position of the item in catalog """
+
+        row = self._connection.execute('SELECT position FROM items WHERE item_id = ?', (int(item_id),)).fetchone()
+        return row[0] if row else None
+
+    def path_of(self, item_id: str) -> str | None:
+        """ Returns path of the item link """
+
+        row = self._connection.execute('SELECT path FROM items WHERE item_id = ?', (int(item_id),)).fetchone()
+        return row[0] if row else None
+
+    def iter_items(self) -> Generator[tuple[int, str, str], None, None]:
+        """ Yields position, item id and path of each item in catalog order """
+
+        for position, item_id, path in self._connection.execute(
+                'SELECT position, item_id, path FROM items ORDER BY position'):
+            yield position, str(item_id), path
+
+    @property
+    def has_order(self) -> bool:
+        return self._connection.execute('SELECT 1 FROM visit_order LIMIT 1').fetchone() is not None
+
+    def set_order(self, item_index_filename: str, from_position: int = 0) -> None:
+        """
+            Sets the order to visit items in by priority and resets the cursor.
+            New items go first, then the items which have not been seen for the longest time,
+            catalog order is kept among the items with the same priority.
+            Args:
+                item_index_filename: SQLite database of the item index with the time the items have been seen
+                from_position: Position in catalog of the first item to visit, the items before it are skipped
+        """
+
+        self._connection.execute('ATTACH DATABASE ? AS item_index', (item_index_filename,))
+
+        try:
+            with self._connection:  # Commits or rolls back the transaction
+                self._connection.execute('DELETE FROM visit_order')
+                # New items get -1 to go first
+                self._connection.execute(
+                    """
+                        INSERT INTO visit_order (rank, position)
+                        SELECT
+                            ROW_NUMBER() OVER (ORDER BY COALESCE(indexed.seen_at, -1), items.position) - 1,
+                            items.position
+                        FROM items
+                        LEFT JOIN item_index.items AS indexed ON indexed.item_id = CAST(items.item_id AS TEXT)
+                        WHERE items.position >= ?
+                    """,
+                    (from_position,)
+                )
+                self._connection.execute("INSERT OR REPLACE INTO state VALUES ('cursor', 0)")
+        finally:
+            self._connection.execute('DETACH DATABASE item_index')
+
+        self._cursor = 0
+
+    @property
+    def cursor(self) -> int:
+        """ Number of items visited in the order """
+
+        return self._cursor
+
+    def save_cursor(self, cursor: int | None = None) -> None:
+        """ Persists the cursor or the passed number of visited items if some of the visited ones are not done yet """
+
+        self._set_state('cursor', self._cursor if cursor is None else cursor)
+
+    def count_pending(self) -> int:
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM visit_order WHERE rank >= ?', (self.cursor,)
+        ).fetchone()[0]
+
+    def iter_pending(self) -> Generator[tuple[int, str, str, str | None], None, None]:
+        """
+            Yields position, item id, path and card fingerprint of each item which has not been visited yet
+            in the visit order.
+            The cursor moves past the item when the next one is requested,
+            so the item is visited again after restart if its processing has failed.
+        """
+
+        while True:
+            row = self._connection.execute(
+                """
+                    SELECT items.position, items.item_id, items.path, items.card_fingerprint FROM visit_order
+                    JOIN items ON items.position = visit_order.position
+                    WHERE visit_order.rank = ?
+                """,
+                (self._cursor,)
+            ).fetchone()
+
+            if row is None:
+                return
+
+            position, item_id, path, card_fingerprint = row
+            yield position, str(item_id), path, card_fingerprint
+
+            self._cursor += 1
@@ -1,13 +1,29 @@
 import os
 import csv
+import re
 from typing import NamedTuple
 from .settings import BASE_DIR
 
 
+# Interval between runs of the link in daemon mode: "30m", "6h", "1d"
+_SCHEDULE_REGEX = re.compile(r'^(\d+(?:\.\d+)?)\s*([mhd])$')
+_SCHEDULE_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
 class Link(NamedTuple):
     id: str
     url: str
     from_item: str | None
+    schedule: str | None = None  # Optional column, DAEMON_DEFAULT_SCHEDULE is used if it is empty
+
+
+def parse_schedule(schedule: str) -> float:
+    """ Returns interval between runs in seconds """
+
+    match = _SCHEDULE_REGEX.match(schedule.strip())
+    assert match, f'Schedule {schedule} must be a number of minutes, hours or days, e.g. 30m, 6h, 1d'
+
+    return float(match.group(1)) * _SCHEDULE_UNITS[match.group(2)]
 
 
 def load_links() -> tuple[Link]:
@@ -21,6 +37,9 @@ def load_links() -> tuple[Link]:
         next(reader)  # Skip title line
         for row in reader:
             row[2] = row[2] if row[2] else None  # from_item=None if it is an empty string
+            if len(row) > 3:
+                row[3] = row[3] if row[3] else None  # schedule=None if it is an empty string
+                assert row[3] is None or parse_schedule(row[3]), f'Schedule of link {row[0]} must be positive'
             links.append(Link(*row))
             links_ids.append(row[0])
 
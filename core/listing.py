@@ -0,0 +1,70 @@
+import os
+import sqlite3
+from typing import Iterable
+from .settings import BASE_DIR, FULL_LISTING_EVERY_N_RUNS
+
+
+class ListingHistory:
+    """
+        Item ids seen in the catalog of the link by the previous runs.
+        Incremental runs stop paginating when pages contain only known items, as new items are listed first.
+        Every FULL_LISTING_EVERY_N_RUNS runs the whole catalog is listed to notice removed items.
+    """
+
+    def __init__(self, link_id: str):
+        filename = os.path.join(BASE_DIR, f'tmp/listings/{link_id}.sqlite3')
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        self._connection = sqlite3.connect(filename)
+        self._connection.executescript(
+            """
+                CREATE TABLE IF NOT EXISTS items (item_id TEXT PRIMARY KEY);
+                CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @property
+    def runs_since_full(self) -> int | None:
+        """ Returns number of incremental runs since the last full listing, None if the catalog has never been listed """
+
+        row = self._connection.execute("SELECT value FROM state WHERE key = 'runs_since_full'").fetchone()
+        return row[0] if row else None
+
+    def is_full_listing_due(self) -> bool:
+        runs_since_full = self.runs_since_full
+        return runs_since_full is None or runs_since_full + 1 >= FULL_LISTING_EVERY_N_RUNS
+
+    def are_known(self, item_ids: list[str]) -> bool:
+        """ Returns True if all the items have been seen before """
+
+        if not item_ids:
+            return True
+
+        known = 0
+        for i in range(0, len(item_ids), 500):  # SQLite limits number of query parameters
+            chunk = item_ids[i:i + 500]
+            known += self._connection.execute(
+                f'SELECT COUNT(*) FROM items WHERE item_id IN ({", ".join("?" * len(chunk))})', chunk
+            ).fetchone()[0]
+
+        return known == len(set(item_ids))
+
+    def save(self, item_ids: Iterable[str], is_full: bool) -> None:
+        """
+            Saves items seen by the run.
+            Items of a full listing replace the known ones, so the removed items are not known anymore.
+        """
+
+        if is_full:
+            self._connection.execute('DELETE FROM items')
+            runs_since_full = 0
+        else:
+            runs_since_full = self.runs_since_full + 1
+
+        self._connection.executemany('INSERT OR IGNORE INTO items VALUES (?)', ((item_id,) for item_id in item_ids))
+        self._connection.execute("INSERT OR REPLACE INTO state VALUES ('runs_since_full', ?)", (runs_since_full,))
+        self._connection.commit()
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Generator
+
+
+def _watch_parent(parent_pid: int, interval: float = 1) -> None:
+    while os.getppid() == parent_pid:
+        time.sleep(interval)
+
+    os._exit(1)  # The parent has died, e.g. it has been killed by the supervisor after a missed heartbeat
+
+
+def _exit_with_parent(parent_pid: int) -> None:
+    """
+        Initializer of the pool workers: exits the worker when its parent dies.
+        A killed parent can not shut the pool down, so its workers would be left running otherwise.
+    """
+
+    threading.Thread(target=_watch_parent, args=(parent_pid,), daemon=True).start()
+
+
+class OrderedPool:
+    """
+        Process pool which returns results in the order of submitting.
+        Submitting waits for the oldest task when too many tasks are pending,
+        so a fast producer does not pile up the bodies to process in memory.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int,
+                 failure_result: Callable[[BrokenProcessPool], Any] | None = None):
+        """
+            Args:
+                max_workers: Number of the worker processes
+                max_pending: Number of the pending tasks to wait for the oldest one after
+                failure_result: Returns result of a task which has been lost as a worker has died, e.g. killed by OOM,
+                    the pool is restarted on the next task. The exception is raised if it is not passed
+        """
+
+        assert max_workers > 0, '`max_workers` parameter must be positive'
+        assert max_pending > 0, '`max_pending` parameter must be positive'
+
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._failure_result = failure_result
+        self._executor: ProcessPoolExecutor | None = None  # Started on the first task
+        self._pending: deque[tuple[Any, Future]] = deque()  # Keys and futures in the order of submitting
+
+    @property
+    def oldest_key(self) -> Any:
+        """ Returns key of the oldest task which result has not been returned yet """
+
+        return self._pending[0][0] if self._pending else None
+
+    def _collect(self, block: bool) -> Generator[tuple[Any, Any], None, None]:
+        """
+            Yields keys and results of the finished tasks in order, waits for the oldest ones if block is True.
+            A task is removed from the pending ones only when its result is taken,
+            so a failed task and the tasks after it stay pending.
+        """
+
+        while self._pending and (self._pending[0][1].done() or (block and len(self._pending) > self._max_pending)):
+            key, future = self._pending[0]
+            result = self._result(future)
+            self._pending.popleft()
+            yield key, result
+
+    def _result(self, future: Future) -> Any:
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            if self._failure_result is None:
+                raise
+
+            return self._failure_result(e)
+
+    def _start(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers, initializer=_exit_with_parent, initargs=(os.getpid(),)
+        )
+
+    def submit(self, key: Any, fn: Callable, *args) -> Generator[tuple[Any, Any], None, None]:
+        """ Submits the task and returns generator of keys and results of the tasks which have been finished """
+
+        if self._executor is None:
+            self._executor = self._start()
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            if self._failure_result is None:
+                raise
+
+            # A worker has died, the tasks pending in the pool get the failure result
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._start()
+            future = self._executor.submit(fn, *args)
+
+        self._pending.append((key, future))
+
+        return self._collect(block=True)
+
+    def put(self, key: Any, result: Any) -> Generator[tuple[Any, Any], None, None]:
+        """ Adds the result which is known without processing to keep it in order with the submitted tasks """
+
+        future = Future()
+        future.set_result(result)
+        self._pending.append((key, future))
+
+        return self._collect(block=True)
+
+    def drain(self) -> Generator[tuple[Any, Any], None, None]:
+        """ Waits for all the pending tasks and yields their keys and results in order """
+
+        while self._pending:
+            key, future = self._pending[0]
+            result = self._result(future)
+            self._pending.popleft()
+            yield key, result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,60 @@
+import json
+import re
+import requests
+from functools import cached_property
+from .settings import FARPOST_ENCODING
+
+
+# Charset explicitly declared in Content-Type header
+_CHARSET_REGEX = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+class FarpostResponse:
+    """
+        Wrapper of requests.Response which decodes the body only once.
+        requests decodes the body on every `.text` access and runs charset detection over the whole body
+        if charset is not declared, so the text is decoded here with the declared charset or
+        with UTF-8 falling back to FARPOST_ENCODING and memoized.
+    """
+
+    def __init__(self, response: requests.Response):
+        assert isinstance(response, requests.Response), '`response` parameter must be a requests.Response instance'
+
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    @property
+    def raw_response(self) -> requests.Response:
+        return self._response
+
+    @property
+    def content(self) -> bytes:
+        return self._response.content
+
+    @cached_property
+    def declared_encoding(self) -> str | None:
+        """ Returns charset declared in Content-Type header if it is presented """
+
+        match = _CHARSET_REGEX.search(self._response.headers.get('content-type', ''))
+
+        return match.group(1) if match else None
+
+    @cached_property
+    def text(self) -> str:
+        content = self._response.content
+
+        if self.declared_encoding:
+            try:
+                return content.decode(self.declared_encoding, errors='replace')
+            except LookupError:  # Unknown charset in the header
+                pass
+
+        try:
+            return content.decode('utf-8')
+        except UnicodeDecodeError:
+            return content.decode(FARPOST_ENCODING, errors='replace')
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
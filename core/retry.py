@@ -0,0 +1,108 @@
+import random
+import time
+from collections import Counter
+from typing import NamedTuple
+import requests
+from .settings import (
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_COOLDOWN_IN_SECONDS
+)
+
+
+class ServerError(requests.exceptions.HTTPError):
+    """ Raised on 5xx response to retry the request """
+
+
+class RetryPolicy(NamedTuple):
+    """
+        How to retry a request failed with a certain error.
+        Args:
+            max_attempts: Number of attempts including the first one
+            base_delay: Delay before the first retry in seconds, doubled on every next retry
+            max_delay: Upper bound of the delay in seconds
+            change_proxy: Fail over to another proxy before retrying
+    """
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    change_proxy: bool
+
+
+# Policies are matched in order, so subclasses must go before their base classes
+RETRY_POLICIES: tuple[tuple[type[Exception], str, RetryPolicy], ...] = (
+    (requests.exceptions.ConnectTimeout, 'connect_timeout', RetryPolicy(5, 1, 30, change_proxy=True)),
+    (requests.exceptions.ReadTimeout, 'read_timeout', RetryPolicy(3, 2, 30, change_proxy=False)),
+    (requests.exceptions.ProxyError, 'proxy_error', RetryPolicy(5, 1, 30, change_proxy=True)),
+    (requests.exceptions.ConnectionError, 'connection_error', RetryPolicy(5, 1, 30, change_proxy=True)),
+    (requests.exceptions.ChunkedEncodingError, 'broken_response', RetryPolicy(3, 2, 30, change_proxy=False)),
+    (ServerError, 'server_error', RetryPolicy(4, 5, 60, change_proxy=False))
+)
+
+RETRIABLE_ERRORS = tuple(error for error, _, _ in RETRY_POLICIES)
+
+
+def resolve_retry_policy(error: Exception) -> tuple[str, RetryPolicy]:
+    """ Returns the name of error class and the retry policy for the error """
+
+    for error_class, name, policy in RETRY_POLICIES:
+        if isinstance(error, error_class):
+            return name, policy
+
+    raise ValueError(f'No retry policy for {error!r}')
+
+
+def backoff_delay(policy: RetryPolicy, attempt: int) -> float:
+    """ Returns bounded exponential delay with full jitter before the retry number `attempt` (starting from 1) """
+
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+        Circuit breaker of a single proxy.
+        Opens after `threshold` consecutive failures and stays open for `cooldown` seconds,
+        then lets one request through (half-open) and closes on its success or opens again on its failure.
+    """
+
+    def __init__(self, threshold: int = CIRCUIT_BREAKER_THRESHOLD, cooldown: float = CIRCUIT_BREAKER_COOLDOWN_IN_SECONDS):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None and time.monotonic() - self._opened_at < self._cooldown
+
+    @property
+    def opened_at(self) -> float | None:
+        return self._opened_at
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> bool:
+        """ Returns True if the breaker has been tripped by this failure """
+
+        self._failures += 1
+
+        # Half-open breaker opens again after a single failure
+        if self._failures >= self._threshold or self._opened_at is not None:
+            self._opened_at = time.monotonic()
+            return True
+
+        return False
+
+
+class RetryStats:
+    """ Counters of retries by error class and circuit breakers trips by proxy """
+
+    def __init__(self):
+        self.retries: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()  # Requests failed after all the attempts
+        self.trips: Counter[str] = Counter()
+
+    def __str__(self):
+        return f'retries: {dict(self.retries)}, failures: {dict(self.failures)}, breaker trips: {dict(self.trips)}'
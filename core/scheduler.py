@@ -0,0 +1,127 @@
+import logging
+import os
+import pickle
+import time
+from datetime import timedelta
+from typing import Iterable, NamedTuple
+from .settings import BASE_DIR, DEFAULT_SECONDS_PER_ITEM
+
+
+logger = logging.getLogger(__file__)
+
+
+class LinkStats(NamedTuple):
+    """ Statistics of the link from the previous runs """
+
+    number_of_items: int
+    seconds_per_item: float
+
+
+def _stats_filename(link_id: str) -> str:
+    return os.path.join(BASE_DIR, f'tmp/scheduler/{link_id}')
+
+
+def load_link_stats(link_id: str) -> LinkStats | None:
+    """ Loads statistics of the link if the link has been parsed before """
+
+    filename = _stats_filename(link_id)
+
+    if not os.path.exists(filename):
+        return
+
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_link_stats(link_id: str, stats: LinkStats) -> None:
+    """ Saves statistics of the link for the next runs """
+
+    filename = _stats_filename(link_id)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename + '.tmp', 'wb') as f:
+        pickle.dump(stats, f)
+    os.replace(filename + '.tmp', filename)
+
+
+def estimate_run_duration(link_ids: Iterable[str]) -> float:
+    """ Returns estimated duration of the run in seconds, links are parsed in parallel so the slowest one is taken """
+
+    durations = [0.0]
+
+    for link_id in link_ids:
+        stats = load_link_stats(link_id)
+
+        if stats:
+            durations.append(stats.number_of_items * stats.seconds_per_item)
+
+    return max(durations)
+
+
+class CrawlScheduler:
+    """
+        Keeps track of the time budget of the link, the items are ordered by priority in the frontier.
+        Time per item is an exponential moving average of observed times, including delays between items.
+    """
+
+    def __init__(self, link_id: str, deadline: float | None = None):
+        self._link_id = link_id
+        self._deadline = deadline  # Unix timestamp to finish the run by
+
+        stats = load_link_stats(link_id)
+        self._seconds_per_item = stats.seconds_per_item if stats else DEFAULT_SECONDS_PER_ITEM
+        self._number_of_items = stats.number_of_items if stats else 0
+        self._item_started_at: float | None = None
+
+    @property
+    def seconds_per_item(self) -> float:
+        return self._seconds_per_item
+
+    def set_number_of_items(self, number_of_items: int, visited: int = 0) -> None:
+        """
+            Args:
+                number_of_items: Number of the items in catalog, saved for the estimations of the next runs
+                visited: Number of the items visited before the run has been resumed from the checkpoint
+        """
+
+        self._number_of_items = number_of_items
+        pending = number_of_items - visited
+
+        estimated = timedelta(seconds=round(pending * self._seconds_per_item))
+        logger.info(
+            f'Scheduler {self._link_id} — {pending} of {number_of_items} items left, estimated duration: {estimated}'
+        )
+
+        if self._deadline and time.time() + pending * self._seconds_per_item > self._deadline:
+            logger.warning(f'Scheduler {self._link_id} — Not all the items will be parsed within the time budget')
+
+    def start_item(self) -> None:
+        self._item_started_at = time.monotonic()
+
+    def finish_item(self) -> None:
+        """ Updates time per item with the time of the current item """
+
+        if self._item_started_at is None:
+            return
+
+        seconds = time.monotonic() - self._item_started_at
+        self._seconds_per_item = 0.8 * self._seconds_per_item + 0.2 * seconds
+        self._item_started_at = None
+
+    def eta(self, remaining_items: int) -> timedelta:
+        return timedelta(seconds=round(remaining_items * self._seconds_per_item))
+
+    def has_time_for(self, seconds: float) -> bool:
+        """ Returns False if the work of the seconds is not expected to be finished before the deadline """
+
+        return self._deadline is None or time.time() + seconds <= self._deadline
+
+    def has_time_for_next_item(self) -> bool:
+        """ Returns False if the next item is not expected to be finished before the deadline """
+
+        return self.has_time_for(self._seconds_per_item)
+
+    def save(self) -> None:
+        """ Saves statistics for the estimations of the next runs """
+
+        save_link_stats(self._link_id, LinkStats(self._number_of_items, self._seconds_per_item))
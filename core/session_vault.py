@@ -0,0 +1,118 @@
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from requests.cookies import RequestsCookieJar
+from user_agent import generate_user_agent
+from .settings import BASE_DIR, SESSION_TTL_IN_HOURS
+
+
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class Identity:
+    """ User-agent and cookies of the sessions made through the proxy """
+
+    proxy_id: str
+    user_agent: str
+    cookies: RequestsCookieJar = field(default_factory=RequestsCookieJar)
+    requests: int = 0  # Requests made with the identity
+    captchas: int = 0  # Captchas solved with the identity
+
+    @property
+    def captchas_per_1000_requests(self) -> float:
+        return 1000 * self.captchas / self.requests if self.requests else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'proxy {self.proxy_id}: {self.requests} requests, {self.captchas} captchas '
+            f'({self.captchas_per_1000_requests:.1f} per 1000 requests)'
+        )
+
+
+class SessionVault:
+    """
+        Identities by proxy and user-agent kept between runs, so a session starts with the cookies
+        of the solved captchas instead of a cold one.
+        Shared between parser processes, so it is stored in SQLite which handles concurrent writers.
+        Identities which have not been used for SESSION_TTL_IN_HOURS are discarded.
+    """
+
+    def __init__(self, filename: str = os.path.join(BASE_DIR, 'tmp/session_vault.sqlite3'),
+                 ttl: float = SESSION_TTL_IN_HOURS * 3600):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        self._ttl = ttl
+        self._connection = sqlite3.connect(filename, timeout=60)
+        self._connection.execute(
+            """
+                CREATE TABLE IF NOT EXISTS identities (
+                    proxy_id TEXT NOT NULL,
+                    user_agent TEXT NOT NULL,
+                    cookies BLOB NOT NULL,
+                    requests INTEGER NOT NULL,
+                    captchas INTEGER NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (proxy_id, user_agent)
+                )
+            """
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def acquire(self, proxy_id: str) -> Identity:
+        """ Returns the last used identity of the proxy if it has not expired or a new one """
+
+        self._connection.execute('DELETE FROM identities WHERE used_at < ?', (time.time() - self._ttl,))
+        self._connection.commit()
+
+        row = self._connection.execute(
+            """
+                SELECT user_agent, cookies, requests, captchas FROM identities
+                WHERE proxy_id = ? ORDER BY used_at DESC LIMIT 1
+            """,
+            (proxy_id,)
+        ).fetchone()
+
+        if row is None:
+            logger.debug(f'Session vault — New identity for proxy {proxy_id}')
+            return Identity(proxy_id=proxy_id, user_agent=generate_user_agent(device_type=['smartphone', 'tablet']))
+
+        user_agent, cookies, requests, captchas = row
+        cookies = pickle.loads(cookies)
+        cookies.clear_expired_cookies()
+
+        identity = Identity(proxy_id=proxy_id, user_agent=user_agent, cookies=cookies,
+                            requests=requests, captchas=captchas)
+        logger.debug(f'Session vault — Warm identity for {identity}, {len(cookies)} cookies')
+
+        return identity
+
+    def save(self, identity: Identity) -> None:
+        """ Adds or replaces the identity with its current cookies and counters """
+
+        self._connection.execute(
+            'INSERT OR REPLACE INTO identities VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                identity.proxy_id,
+                identity.user_agent,
+                pickle.dumps(identity.cookies),
+                identity.requests,
+                identity.captchas,
+                time.time()
+            )
+        )
+        self._connection.commit()
+
+    def discard(self, identity: Identity) -> None:
+        """ Removes the identity, e.g. if its cookies do not pass captcha anymore """
+
+        self._connection.execute(
+            'DELETE FROM identities WHERE proxy_id = ? AND user_agent = ?', (identity.proxy_id, identity.user_agent)
+        )
+        self._connection.commit()
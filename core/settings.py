@@ -22,6 +22,69 @@ EMAIL_RECIPIENTS = env.list('EMAIL_RECIPIENTS')
 
 LOGS_ROTATING_INTERVAL_IN_HOURS = env.int('LOGS_ROTATING_INTERVAL_IN_HOURS')
 
+# Encoding of farpost.ru responses which are not valid UTF-8 and do not declare charset
+FARPOST_ENCODING = env.str('FARPOST_ENCODING', 'windows-1251')
+
+# Coordination of several nodes parsing the same input/links.csv
+LEASE_TTL_IN_SECONDS = env.int('LEASE_TTL_IN_SECONDS', 600)
+LEASE_MAX_ATTEMPTS = env.int('LEASE_MAX_ATTEMPTS', 3)
+COORDINATOR_AUTHKEY = env.str('COORDINATOR_AUTHKEY', '')
+
+# Requests timeouts and retries
+REQUEST_CONNECT_TIMEOUT_IN_SECONDS = env.float('REQUEST_CONNECT_TIMEOUT_IN_SECONDS', 10)
+REQUEST_READ_TIMEOUT_IN_SECONDS = env.float('REQUEST_READ_TIMEOUT_IN_SECONDS', 30)
+CIRCUIT_BREAKER_THRESHOLD = env.int('CIRCUIT_BREAKER_THRESHOLD', 3)
+CIRCUIT_BREAKER_COOLDOWN_IN_SECONDS = env.int('CIRCUIT_BREAKER_COOLDOWN_IN_SECONDS', 300)
+
+# Typed columnar output next to .xml files: parquet (requires pyarrow, csv otherwise), csv or empty to disable
+COLUMNAR_EXPORT_FORMAT = env.str('COLUMNAR_EXPORT_FORMAT', 'parquet')
+
+# Output only items added, changed and removed since the previous run, full output is saved every N runs
+DELTA_MODE = env.bool('DELTA_MODE', False)
+DELTA_FULL_OUTPUT_EVERY_N_RUNS = env.int('DELTA_FULL_OUTPUT_EVERY_N_RUNS', 7)
+
+# Time budget of the run (0 for no budget) and time per item for the first run estimation
+CRAWL_TIME_BUDGET_IN_MINUTES = env.int('CRAWL_TIME_BUDGET_IN_MINUTES', 0)
+DEFAULT_SECONDS_PER_ITEM = env.float('DEFAULT_SECONDS_PER_ITEM', 15)
+
+# Cookies and user-agent of each proxy are reused between runs until they have not been used for this time
+SESSION_TTL_IN_HOURS = env.float('SESSION_TTL_IN_HOURS', 12)
+
+# Restarts of crashed or hung parsers with exponential delay, parsed records are saved every N items to restart from
+SUPERVISOR_MAX_RESTARTS = env.int('SUPERVISOR_MAX_RESTARTS', 5)
+SUPERVISOR_RESTART_BASE_DELAY_IN_SECONDS = env.float('SUPERVISOR_RESTART_BASE_DELAY_IN_SECONDS', 30)
+SUPERVISOR_RESTART_MAX_DELAY_IN_SECONDS = env.float('SUPERVISOR_RESTART_MAX_DELAY_IN_SECONDS', 600)
+WORKER_HEARTBEAT_TIMEOUT_IN_SECONDS = env.float('WORKER_HEARTBEAT_TIMEOUT_IN_SECONDS', 900)
+CHECKPOINT_EVERY_N_ITEMS = env.int('CHECKPOINT_EVERY_N_ITEMS', 20)
+
+# Processes parsing item pages of each parser (0 for the number of cores divided between the parsers of the run)
+# and item pages waiting to be parsed before fetching waits for them (0 for twice the number of processes)
+PARSE_WORKERS = env.int('PARSE_WORKERS', 0)
+PARSE_QUEUE_SIZE = env.int('PARSE_QUEUE_SIZE', 0)
+
+# Database of the records of all the runs for query.py, relative to the project directory, empty to disable
+RESULTS_DATABASE = env.str('RESULTS_DATABASE', 'output/results.sqlite3')
+
+# Stop paginating the catalog after N consecutive pages of items seen by the previous runs,
+# the whole catalog is listed anyway every N runs to notice removed items
+INCREMENTAL_LISTING = env.bool('INCREMENTAL_LISTING', False)
+INCREMENTAL_LISTING_STOP_AFTER_N_KNOWN_PAGES = env.int('INCREMENTAL_LISTING_STOP_AFTER_N_KNOWN_PAGES', 2)
+FULL_LISTING_EVERY_N_RUNS = env.int('FULL_LISTING_EVERY_N_RUNS', 7)
+
+# Visit pages of the items which are new or which catalog cards (title, price, annotation) have changed only
+LISTING_ONLY_MODE = env.bool('LISTING_ONLY_MODE', False)
+
+# Merge tires and disks of all the links into a single feed per item type without duplicates at the end of the run
+MASTER_FEED = env.bool('MASTER_FEED', False)
+
+# Daemon mode: interval between runs of the links without a schedule in input/links.csv
+# and host:port of the local status endpoint (empty to disable it)
+DAEMON_DEFAULT_SCHEDULE = env.str('DAEMON_DEFAULT_SCHEDULE', '1d')
+DAEMON_STATUS_ADDRESS = env.str('DAEMON_STATUS_ADDRESS', '127.0.0.1:8765')
+
+# Share of the catalog pages and items traced to output/{id}_{timestamp}_trace.json (0 to disable tracing)
+TRACE_SAMPLE_RATE = env.float('TRACE_SAMPLE_RATE', 0)
+
 logging.basicConfig(
     level=logging.DEBUG,
     format='{levelname} {asctime} - {message}',
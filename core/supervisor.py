@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+import random
+import time
+from dataclasses import dataclass
+from multiprocessing import Process
+from typing import Callable
+from .settings import (
+    SUPERVISOR_MAX_RESTARTS,
+    SUPERVISOR_RESTART_BASE_DELAY_IN_SECONDS,
+    SUPERVISOR_RESTART_MAX_DELAY_IN_SECONDS,
+    WORKER_HEARTBEAT_TIMEOUT_IN_SECONDS
+)
+
+
+logger = logging.getLogger(__file__)
+
+
+class Heartbeat:
+    """ Time of the last sign of life of a worker process, shared with the supervisor """
+
+    def __init__(self):
+        self._value = multiprocessing.Value('d', time.time())
+
+    def beat(self) -> None:
+        self._value.value = time.time()
+
+    def seconds_since(self) -> float:
+        return time.time() - self._value.value
+
+
+@dataclass
+class Worker:
+    link_id: str
+    proxy_id: str
+    process: Process | None = None
+    heartbeat: Heartbeat | None = None
+    restarts: int = 0
+    restart_at: float | None = None  # Unix timestamp to restart the crashed worker at
+    is_finished: bool = False
+    is_crash_loop: bool = False  # Has crashed more than max_restarts times
+
+
+class Supervisor:
+    """
+        Runs a worker process for each link and watches their exit codes and heartbeats.
+        A crashed or hung worker is restarted after an exponential delay with another proxy,
+        the parser continues from its checkpoint in tmp/parser_{link_id}.
+        A link which keeps crashing after max_restarts restarts is given up and reported.
+    """
+
+    def __init__(self, target: Callable, proxy_ids: list[str],
+                 max_restarts: int = SUPERVISOR_MAX_RESTARTS,
+                 base_delay: float = SUPERVISOR_RESTART_BASE_DELAY_IN_SECONDS,
+                 max_delay: float = SUPERVISOR_RESTART_MAX_DELAY_IN_SECONDS,
+                 heartbeat_timeout: float = WORKER_HEARTBEAT_TIMEOUT_IN_SECONDS,
+                 deadline: float | None = None):
+        """
+            Args:
+                target: Function to run in the worker process, called as target(link_id, proxy_id, heartbeat=heartbeat)
+                proxy_ids: All the proxies to choose from on restart
+                deadline: Unix timestamp after which crashed workers are not restarted
+        """
+
+        self._target = target
+        self._proxy_ids = proxy_ids
+        self._max_restarts = max_restarts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._heartbeat_timeout = heartbeat_timeout
+        self._deadline = deadline
+        self._workers: list[Worker] = []
+
+    def add(self, link_id: str, proxy_id: str) -> None:
+        self._workers.append(Worker(link_id=link_id, proxy_id=proxy_id))
+
+    def _start(self, worker: Worker) -> None:
+        worker.heartbeat = Heartbeat()
+        worker.process = Process(
+            target=self._target, args=(worker.link_id, worker.proxy_id), kwargs={'heartbeat': worker.heartbeat}
+        )
+        worker.process.start()
+        worker.restart_at = None
+
+        logger.debug(f'Supervisor — Started link {worker.link_id} with proxy {worker.proxy_id}, pid {worker.process.pid}')
+
+    def _fresh_proxy_id(self, worker: Worker) -> str:
+        """ Returns a proxy which is not used by the other running workers, the current one if there is no such """
+
+        in_use = {w.proxy_id for w in self._workers if w is not worker and w.process and w.process.is_alive()}
+        available = [proxy_id for proxy_id in self._proxy_ids if proxy_id not in in_use and proxy_id != worker.proxy_id]
+
+        return random.choice(available) if available else worker.proxy_id
+
+    def _on_crash(self, worker: Worker, reason: str) -> None:
+        """ Schedules restart of the crashed worker or gives it up """
+
+        worker.process = None
+
+        if worker.restarts >= self._max_restarts:
+            logger.error(f'Supervisor — Link {worker.link_id} {reason}, giving up after {worker.restarts} restarts')
+            worker.is_crash_loop = True
+            return
+
+        if self._deadline and time.time() >= self._deadline:
+            logger.error(f'Supervisor — Link {worker.link_id} {reason}, the time budget is over')
+            worker.is_finished = True
+            return
+
+        worker.restarts += 1
+        delay = min(self._base_delay * 2 ** (worker.restarts - 1), self._max_delay)
+        worker.restart_at = time.time() + delay
+        worker.proxy_id = self._fresh_proxy_id(worker)
+
+        logger.warning(
+            f'Supervisor — Link {worker.link_id} {reason}, restart {worker.restarts} of {self._max_restarts} '
+            f'in {delay:.0f}s with proxy {worker.proxy_id}'
+        )
+
+    def _check(self, worker: Worker) -> None:
+        if worker.is_finished or worker.is_crash_loop:
+            return
+
+        if worker.process is None:
+            if time.time() >= worker.restart_at:
+                self._start(worker)
+            return
+
+        if worker.process.is_alive():
+            if worker.heartbeat.seconds_since() > self._heartbeat_timeout:
+                worker.process.kill()
+                worker.process.join()
+                self._on_crash(worker, f'has no heartbeat for {self._heartbeat_timeout:.0f}s')
+            return
+
+        worker.process.join()
+
+        if worker.process.exitcode == 0:
+            logger.debug(f'Supervisor — Link {worker.link_id} finished')
+            worker.is_finished = True
+        else:
+            self._on_crash(worker, f'crashed with exit code {worker.process.exitcode}')
+
+    def run(self, interval: float = 1) -> list[str]:
+        """ Runs the workers until they are finished or given up, returns ids of the crash loop links """
+
+        for worker in self._workers:
+            self._start(worker)
+
+        while not all(worker.is_finished or worker.is_crash_loop for worker in self._workers):
+            time.sleep(interval)
+
+            for worker in self._workers:
+                self._check(worker)
+
+        return [worker.link_id for worker in self._workers if worker.is_crash_loop]
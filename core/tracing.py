@@ -0,0 +1,168 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Generator
+
+
+class Tracer:
+    """
+        Timeline of the spans of the run in Chrome trace format, which is opened by chrome://tracing or Perfetto.
+        Whether a span is recorded is decided for the outermost one, so a sampled item is traced as a whole.
+    """
+
+    def __init__(self, sample_rate: float, **attributes):
+        """
+            Args:
+                sample_rate: Share of the outermost spans to record with their nested spans, from 0 to 1
+                attributes: Arguments of all the spans, e.g. link_id
+        """
+
+        assert 0 <= sample_rate <= 1, '`sample_rate` parameter must be from 0 to 1'
+
+        self._sample_rate = sample_rate
+        self._attributes = attributes
+        self._stack: list[tuple[bool, dict]] = []  # Open spans: whether they are sampled and their arguments
+        self.events: list[dict] = []
+
+    @property
+    def is_sampled(self) -> bool:
+        """ Returns True if the current span is recorded """
+
+        return bool(self._stack) and self._stack[-1][0]
+
+    @contextmanager
+    def span(self, name: str, **args) -> Generator[None, None, None]:
+        """ Records the span with the arguments of the enclosing spans and its own ones if it is sampled """
+
+        if self._stack:
+            is_sampled, parent_args = self._stack[-1]
+        else:
+            is_sampled, parent_args = random.random() < self._sample_rate, self._attributes
+
+        if not is_sampled:
+            self._stack.append((False, parent_args))
+            try:
+                yield
+            finally:
+                self._stack.pop()
+            return
+
+        args = {**parent_args, **args}
+        self._stack.append((True, args))
+        started_at = time.time()
+
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self.events.append(
+                {
+                    'name': name,
+                    'ph': 'X',  # Complete event
+                    'ts': started_at * 1_000_000,  # Microseconds
+                    'dur': (time.time() - started_at) * 1_000_000,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                    'args': args
+                }
+            )
+
+    def add_events(self, events: list[dict], **args) -> None:
+        """ Adds events recorded by another process with the common arguments and the passed ones """
+
+        for event in events:
+            event['args'] = {**self._attributes, **args, **event['args']}
+            self.events.append(event)
+
+    def save(self, filename: str, process_name: str) -> None:
+        """ Saves the recorded events as Chrome trace json """
+
+        pids = {event['pid'] for event in self.events}
+        metadata = [
+            {
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': pid,
+                'args': {'name': process_name if pid == os.getpid() else f'{process_name} parse worker {pid}'}
+            }
+            for pid in sorted(pids)
+        ]
+
+        with open(filename + '.tmp', 'w') as f:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(filename + '.tmp', filename)
+
+
+_tracer: Tracer | None = None  # Tracer of the current process, tracing is disabled if it is None
+
+
+def start(sample_rate: float, **attributes) -> Tracer:
+    """ Starts tracing of the current process """
+
+    global _tracer
+    _tracer = Tracer(sample_rate, **attributes)
+    return _tracer
+
+
+def stop() -> None:
+    global _tracer
+    _tracer = None
+
+
+def is_sampled() -> bool:
+    return _tracer is not None and _tracer.is_sampled
+
+
+@contextmanager
+def span(name: str, **args) -> Generator[None, None, None]:
+    """ Records the span if tracing is started and the span is sampled """
+
+    if _tracer is None:
+        yield
+        return
+
+    with _tracer.span(name, **args):
+        yield
+
+
+def traced(fn: Callable) -> Callable:
+    """ Records calls of the function as spans named by the function """
+
+    name = fn.__qualname__.replace('.<locals>', '')
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return fn(*args, **kwargs)
+
+        with _tracer.span(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def add_events(events: list[dict], **args) -> None:
+    if _tracer is not None:
+        _tracer.add_events(events, **args)
+
+
+def traced_call(is_traced: bool, fn: Callable, *args) -> tuple[Any, list[dict]]:
+    """
+        Calls the function in a pool process, returns its result and the spans recorded during the call
+        to add them to the tracer of the parser if the call is traced
+    """
+
+    global _tracer
+
+    # Forked pool processes inherit the tracer of the parser, the spans recorded by it would never be saved
+    _tracer = Tracer(sample_rate=1) if is_traced else None  # The function is expected to be traced itself
+
+    try:
+        result = fn(*args)
+        return result, _tracer.events if _tracer is not None else []
+    finally:
+        _tracer = None
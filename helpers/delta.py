@@ -0,0 +1,116 @@
+import os
+import pickle
+from datetime import datetime
+from typing import NamedTuple
+from core.settings import BASE_DIR
+from helpers.parse_html import Tire, Disk
+
+
+class Snapshot(NamedTuple):
+    """ Records of the previous run by item id """
+
+    records: dict[str, dict]
+    runs_since_full: int  # Number of delta runs since the last full output
+    created_at: datetime
+
+
+class Delta(NamedTuple):
+    added: list[Tire | Disk]
+    changed: list[Tire | Disk]
+    removed: list[str]  # Ids of removed items
+
+
+def _snapshot_filename(link_id: str, name: str) -> str:
+    return os.path.join(BASE_DIR, f'tmp/snapshots/{link_id}_{name}')
+
+
+def load_snapshot(link_id: str, name: str) -> Snapshot | None:
+    """ Loads snapshot of the link records with the name (tires, disks) if it exists """
+
+    filename = _snapshot_filename(link_id, name)
+
+    if not os.path.exists(filename):
+        return
+
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_snapshot(link_id: str, name: str, records: list[Tire | Disk], runs_since_full: int,
+                  previous: Snapshot | None = None) -> None:
+    """
+        Saves snapshot of the link records with the name (tires, disks) to compare the next run with.
+        Records of the previous snapshot are kept if it is passed (the run has not visited all the items).
+    """
+
+    filename = _snapshot_filename(link_id, name)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    snapshot_records = dict(previous.records) if previous else {}
+    snapshot_records.update((record.item_id, record.__dict__()) for record in records if record.item_id)
+
+    snapshot = Snapshot(
+        records=snapshot_records,
+        runs_since_full=runs_since_full,
+        created_at=datetime.now()
+    )
+
+    # Write to a temporary file first not to lose the previous snapshot if the process is killed while writing
+    with open(filename + '.tmp', 'wb') as f:
+        pickle.dump(snapshot, f)
+    os.replace(filename + '.tmp', filename)
+
+
+def compute_delta(snapshot: Snapshot, records: list[Tire | Disk], is_complete: bool = True) -> Delta:
+    """
+        Returns records added and changed since the snapshot and ids of the removed ones.
+        Nothing is considered removed if the run is not complete, as missing items may have just not been visited.
+    """
+
+    delta = Delta(added=[], changed=[], removed=[])
+    current_ids = set()
+
+    for record in records:
+        if not record.item_id:
+            continue
+
+        current_ids.add(record.item_id)
+        previous = snapshot.records.get(record.item_id)
+
+        if previous is None:
+            delta.added.append(record)
+        elif previous != record.__dict__():
+            delta.changed.append(record)
+
+    if is_complete:
+        delta.removed.extend(item_id for item_id in snapshot.records if item_id not in current_ids)
+
+    return delta
+
+
+def save_delta_to_xml(filename: str, delta: Delta) -> None:
+    """ Saves delta to xml output file """
+
+    with open(filename, 'w') as f:
+        f.write(
+            """<?xml version="1.0" encoding="UTF-8"?>
+                <delta>
+            """
+        )
+
+        f.write('<added>')
+        for record in delta.added:
+            f.write(record.to_xml())
+        f.write('</added>')
+
+        f.write('<changed>')
+        for record in delta.changed:
+            f.write(record.to_xml())
+        f.write('</changed>')
+
+        f.write('<removed>')
+        for item_id in delta.removed:
+            f.write(f'<itemId>{item_id}</itemId>')
+        f.write('</removed>')
+
+        f.write('</delta>')
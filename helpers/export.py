@@ -0,0 +1,176 @@
+import csv
+import logging
+import re
+from operator import attrgetter
+from typing import Callable, Iterable, NamedTuple
+from helpers.parse_html import Tire, Disk
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is a dependency of the project, typed CSV is written if it is not installed anyway
+    pyarrow = None
+
+
+logger = logging.getLogger(__file__)
+
+# A number with either dot or comma as a decimal separator: "R17", "6,5J", "ET -10", "24000.0"
+_NUMBER_REGEX = re.compile(r'-?\d+(?:[.,]\d+)?')
+
+# PCD: number of holes and diameter of their circle: "5x114.3", "5х114,3" (cyrillic), "4*100"
+_PCD_REGEX = re.compile(r'(\d+)\s*[xхXХ×*]\s*(\d+(?:[.,]\d+)?)')
+
+
+class Column(NamedTuple):
+    """
+        Declares a column of the columnar export.
+        Args:
+            name: Name of the column
+            attribute: Name of the record attribute to take raw values from
+            type: str, int or float
+            regex: Regex to extract the value from a raw string, the raw string is taken as is if None
+            group: Group of the regex match to take
+    """
+
+    name: str
+    attribute: str
+    type: type = str
+    regex: re.Pattern | None = None
+    group: int = 0
+
+
+TIRE_COLUMNS = (
+    Column('item_id', 'item_id'),
+    Column('title', 'title'),
+    Column('price', 'price', float, _NUMBER_REGEX),
+    Column('in_set_quantity', 'the_number_of_tires_in_an_indivisible_set', int, _NUMBER_REGEX),
+    Column('total_sets', 'total_sets', int, _NUMBER_REGEX),
+    Column('year', 'tire_year', int, _NUMBER_REGEX),
+    Column('tread', 'tread'),
+    Column('condition', 'product_condition'),
+    Column('landing_diameter', 'landing_diameter', float, _NUMBER_REGEX),
+    Column('profile_width', 'profile_width', float, _NUMBER_REGEX),
+    Column('profile_height', 'profile_height', float, _NUMBER_REGEX),
+    Column('frame', 'frame'),
+    Column('availability', 'availability_of_goods'),
+    Column('tire_type', 'tire_type'),
+    Column('description', 'description')
+)
+
+DISK_COLUMNS = (
+    Column('item_id', 'item_id'),
+    Column('title', 'title'),
+    Column('price', 'price', float, _NUMBER_REGEX),
+    Column('in_set_quantity', 'number_of_discs_included', int, _NUMBER_REGEX),
+    Column('total_sets', 'number_of_sets', int, _NUMBER_REGEX),
+    Column('condition', 'product_condition'),
+    Column('diameter', 'diameter', float, _NUMBER_REGEX),
+    Column('width', 'disc_width', float, _NUMBER_REGEX),
+    Column('et', 'departure_ET', float, _NUMBER_REGEX),
+    Column('pcd_holes', 'drilling_PCD', int, _PCD_REGEX, group=1),
+    Column('pcd_diameter', 'drilling_PCD', float, _PCD_REGEX, group=2),
+    Column('disk_type', 'type_of'),
+    Column('dia', 'CH_diameter_DIA', float, _NUMBER_REGEX),
+    Column('availability', 'product_availability'),
+    Column('description', 'description')
+)
+
+COLUMNS = {
+    Tire: TIRE_COLUMNS,
+    Disk: DISK_COLUMNS
+}
+
+
+def _normalizer(column: Column) -> Callable[[str | None], str | int | float | None]:
+    """ Returns function which converts a raw string to the column value """
+
+    def normalize(value: str | None) -> str | int | float | None:
+        if value is None or column.regex is None:
+            return value
+
+        match = column.regex.search(value)
+
+        if match is None:
+            return
+
+        number = float(match.group(column.group).replace(',', '.'))
+        return int(number) if column.type is int else number
+
+    return normalize
+
+
+def normalize_column(values: list[str | None], column: Column) -> list[str | int | float | None]:
+    """
+        Returns normalized values of the whole column.
+        Sizes, PCD and prices are repeated a lot across the catalog,
+        so each distinct raw value is normalized only once.
+    """
+
+    normalize = _normalizer(column)
+    normalized = {value: normalize(value) for value in set(values)}
+
+    return [normalized[value] for value in values]
+
+
+def to_columns(records: Iterable[Tire | Disk], columns: tuple[Column, ...]) -> dict[str, list]:
+    """ Returns normalized columns of the records batch """
+
+    records = list(records)
+    raw_columns = {}  # Raw values by attribute, some columns are taken from the same attribute
+    result = {}
+
+    for column in columns:
+        if column.attribute not in raw_columns:
+            raw_columns[column.attribute] = list(map(attrgetter(column.attribute), records))
+
+        result[column.name] = normalize_column(raw_columns[column.attribute], column)
+
+    return result
+
+
+def _write_parquet(filename: str, columns: dict[str, list], definitions: tuple[Column, ...]) -> None:
+    types = {str: pyarrow.string(), int: pyarrow.int64(), float: pyarrow.float64()}
+
+    table = pyarrow.table({
+        column.name: pyarrow.array(columns[column.name], type=types[column.type]) for column in definitions
+    })
+    pyarrow.parquet.write_table(table, filename)
+
+
+def _write_csv(filename: str, columns: dict[str, list], definitions: tuple[Column, ...]) -> None:
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(column.name for column in definitions)
+        writer.writerows(zip(*(columns[column.name] for column in definitions)))
+
+
+def save_columnar(filename_without_extension: str, records: list[Tire | Disk], record_type: type,
+                  file_format: str = 'parquet') -> str:
+    """
+        Saves records batch as typed columnar file.
+        Args:
+            filename_without_extension: Path of the output file, extension is added by the format
+            records: Tire or Disk records
+            record_type: Tire or Disk
+            file_format: 'parquet' or 'csv', falls back to 'csv' with a warning if pyarrow is not installed
+        Returns:
+            Path of the saved file
+    """
+
+    assert file_format in ('parquet', 'csv'), '`file_format` parameter must be either parquet or csv'
+
+    definitions = COLUMNS[record_type]
+    columns = to_columns(records, definitions)
+
+    if file_format == 'parquet' and pyarrow is not None:
+        filename = f'{filename_without_extension}.parquet'
+        _write_parquet(filename, columns, definitions)
+    else:
+        filename = f'{filename_without_extension}.csv'
+
+        if file_format == 'parquet':
+            logger.warning(f'pyarrow is not installed, {filename} is saved instead of parquet, run poetry install')
+
+        _write_csv(filename, columns, definitions)
+
+    return filename
@@ -0,0 +1,121 @@
+import os
+import pickle
+import sqlite3
+import time
+from typing import NamedTuple
+from core.settings import BASE_DIR
+from helpers.parse_html import EXTRACTOR_VERSION, ItemType, Tire, Disk
+
+
+# Record classes by item type to restore records from dictionaries
+_RECORD_TYPES = {
+    ItemType.TIRE: Tire,
+    ItemType.DISK: Disk
+}
+
+
+class IndexedItem(NamedTuple):
+    fingerprint: str
+    item_type: ItemType | None
+    record: Tire | Disk | None
+    parse_seconds: float  # Time spent to parse the item page
+    seen_at: float  # Unix timestamp of the last time the item has been seen
+    card_fingerprint: str | None = None  # Fingerprint of the catalog card of the item
+
+
+class ItemIndex:
+    """
+        Local index of parsed items by item id.
+        Items parsed by another version of the extractors are considered missing, so their pages are parsed again.
+        Shared between parser processes, so it is stored in SQLite which handles concurrent writers.
+    """
+
+    def __init__(self, filename: str = os.path.join(BASE_DIR, 'tmp/item_index.sqlite3')):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        self.filename = filename
+        self._connection = sqlite3.connect(filename, timeout=60)
+        self._connection.execute(
+            """
+                CREATE TABLE IF NOT EXISTS items (
+                    item_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    item_type BLOB,
+                    record BLOB,
+                    parse_seconds REAL NOT NULL,
+                    seen_at REAL NOT NULL,
+                    card_fingerprint TEXT,
+                    extractor_version TEXT
+                )
+            """
+        )
+
+        # Indices created before catalog cards have been indexed
+        columns = {row[1] for row in self._connection.execute('PRAGMA table_info(items)')}
+        if 'card_fingerprint' not in columns:
+            self._connection.execute('ALTER TABLE items ADD COLUMN card_fingerprint TEXT')
+        if 'extractor_version' not in columns:
+            self._connection.execute('ALTER TABLE items ADD COLUMN extractor_version TEXT')
+
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def get(self, item_id: str) -> IndexedItem | None:
+        """ Returns indexed item by its id if it exists and has been parsed by the current extractors """
+
+        row = self._connection.execute(
+            """
+                SELECT fingerprint, item_type, record, parse_seconds, seen_at, card_fingerprint
+                FROM items WHERE item_id = ? AND extractor_version = ?
+            """,
+            (item_id, EXTRACTOR_VERSION)
+        ).fetchone()
+
+        if row is None:
+            return
+
+        fingerprint, item_type, record, parse_seconds, seen_at, card_fingerprint = row
+        item_type = pickle.loads(item_type)
+
+        return IndexedItem(
+            fingerprint=fingerprint,
+            item_type=item_type,
+            record=_RECORD_TYPES[item_type].from_dict(pickle.loads(record)) if record is not None else None,
+            parse_seconds=parse_seconds,
+            seen_at=seen_at,
+            card_fingerprint=card_fingerprint
+        )
+
+    def put(self, item_id: str, fingerprint: str, item_type: ItemType | None, record: Tire | Disk | None,
+            parse_seconds: float, card_fingerprint: str | None = None) -> None:
+        """ Adds or replaces indexed item """
+
+        self._connection.execute(
+            """
+                INSERT OR REPLACE INTO items
+                (item_id, fingerprint, item_type, record, parse_seconds, seen_at, card_fingerprint, extractor_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                item_id,
+                fingerprint,
+                pickle.dumps(item_type),
+                pickle.dumps(record.__dict__()) if record is not None else None,
+                parse_seconds,
+                time.time(),
+                card_fingerprint,
+                EXTRACTOR_VERSION
+            )
+        )
+        self._connection.commit()
+
+    def touch(self, item_id: str, card_fingerprint: str | None = None) -> None:
+        """ Updates the time the item has been seen and the fingerprint of its catalog card if it is passed """
+
+        self._connection.execute(
+            'UPDATE items SET seen_at = ?, card_fingerprint = COALESCE(?, card_fingerprint) WHERE item_id = ?',
+            (time.time(), card_fingerprint, item_id)
+        )
+        self._connection.commit()
@@ -0,0 +1,96 @@
+import heapq
+import json
+import os
+from operator import itemgetter
+from typing import Generator, Iterable
+from core.settings import BASE_DIR
+from helpers.parse_html import Tire, Disk
+
+
+# Record types by output name
+RECORD_TYPES = {
+    'tires': Tire,
+    'disks': Disk
+}
+
+
+def spill_filename(link_id: str, name: str) -> str:
+    return os.path.join(BASE_DIR, f'tmp/merge/{link_id}_{name}.jsonl')
+
+
+def save_spill(link_id: str, name: str, records: list[Tire | Disk]) -> None:
+    """
+        Saves records of the link with the name (tires, disks) sorted by item id to merge them with the other links.
+        Records without item id are skipped as they can not be deduplicated.
+    """
+
+    filename = spill_filename(link_id, name)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    records = sorted((record for record in records if record.item_id), key=lambda record: int(record.item_id))
+
+    with open(filename + '.tmp', 'w') as f:
+        for record in records:
+            f.write(json.dumps(record.__dict__(), ensure_ascii=False) + '\n')
+    os.replace(filename + '.tmp', filename)
+
+
+def _iter_spill(filename: str) -> Generator[tuple[int, dict], None, None]:
+    """ Yields item ids and records of the spill one by one """
+
+    with open(filename) as f:
+        for line in f:
+            record = json.loads(line)
+            yield int(record['itemId']), record
+
+
+def merge_spills(name: str, link_ids: Iterable[str], filename: str, since: float | None = None) -> tuple[int, int]:
+    """
+        Merges sorted spills of the links into a single xml file sorted by item id without duplicates,
+        reading a single record of each spill at a time.
+        Writes an index with byte offsets of the items next to the xml file: {filename}_index.csv.
+        Args:
+            name: tires or disks
+            link_ids: Ids of the links to merge
+            filename: Path of the merged xml file
+            since: Unix timestamp, spills saved before it are considered to be left from the previous runs and skipped
+        Returns:
+            Number of the merged records and number of the duplicates skipped
+    """
+
+    record_type = RECORD_TYPES[name]
+    filenames = []
+
+    for link_id in link_ids:
+        spill = spill_filename(link_id, name)
+
+        if os.path.exists(spill) and (since is None or os.path.getmtime(spill) >= since):
+            filenames.append(spill)
+
+    merged = duplicates = 0
+    previous_item_id = None
+    index_filename = os.path.splitext(filename)[0] + '_index.csv'
+
+    with open(filename, 'wb') as f, open(index_filename, 'w') as index:
+        f.write(
+            """<?xml version="1.0" encoding="UTF-8"?>
+                <products>
+            """.encode()
+        )
+        index.write('item_id;offset;length\n')
+
+        for item_id, record in heapq.merge(*map(_iter_spill, filenames), key=itemgetter(0)):
+            if item_id == previous_item_id:  # The item is listed by several links
+                duplicates += 1
+                continue
+
+            xml = record_type.from_dict(record).to_xml().encode()
+            index.write(f'{item_id};{f.tell()};{len(xml)}\n')
+            f.write(xml)
+
+            previous_item_id = item_id
+            merged += 1
+
+        f.write('</products>'.encode())
+
+    return merged, duplicates
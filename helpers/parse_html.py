@@ -1,10 +1,18 @@
+import hashlib
 import json
 import math
 import re
+import time
+import traceback
 from bs4 import BeautifulSoup
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
+from html import unescape
+from html.parser import HTMLParser
 from pathlib import Path
+from typing import Callable, Generator, NamedTuple
+from core.tracing import traced
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,6 +44,7 @@ class Tire:
     availability_of_goods: str
     tire_type: str
     description: str
+    item_id: str | None = None
 
     def __dict__(self):
         return {
@@ -52,7 +61,8 @@ class Tire:
             'frame': self.frame,
             'availabilityOfGoods': self.availability_of_goods,
             'tireType': self.tire_type,
-            'description': self.description
+            'description': self.description,
+            'itemId': self.item_id
         }
 
     @classmethod
@@ -71,11 +81,13 @@ class Tire:
             frame=_dict['frame'],
             availability_of_goods=_dict['availabilityOfGoods'],
             tire_type=_dict['tireType'],
-            description=_dict['description']
+            description=_dict['description'],
+            item_id=_dict.get('itemId')  # Records dumped before item ids were added have no id
         )
 
     def to_xml(self):
         return f"""<Tire>
+            <itemId>{self.item_id}</itemId>
             <title>{self.title}</title>
             <price>{self.price}</price>
             <theNumberOfTiresInAnIndivisibleSet>{self.the_number_of_tires_in_an_indivisible_set}</theNumberOfTiresInAnIndivisibleSet>
@@ -108,6 +120,7 @@ class Disk:
     CH_diameter_DIA: str
     product_availability: str
     description: str
+    item_id: str | None = None
 
     def __dict__(self):
         return {
@@ -123,7 +136,8 @@ class Disk:
             'TypeOf': self.type_of,
             'CHDiameterDIA': self.CH_diameter_DIA,
             'ProductAvailability': self.product_availability,
-            'description': self.description
+            'description': self.description,
+            'itemId': self.item_id
         }
 
     @classmethod
@@ -141,11 +155,13 @@ class Disk:
             type_of=_dict['TypeOf'],
             CH_diameter_DIA=_dict['CHDiameterDIA'],
             product_availability=_dict['ProductAvailability'],
-            description=_dict['description']
+            description=_dict['description'],
+            item_id=_dict.get('itemId')  # Records dumped before item ids were added have no id
         )
 
     def to_xml(self):
         return f"""<Disk>
+            <itemId>{self.item_id}</itemId>
             <title>{self.title}</title>
             <price>{self.price}</price>
             <NumberOfDiscsIncluded>{self.number_of_discs_included}</NumberOfDiscsIncluded>
@@ -162,43 +178,270 @@ class Disk:
         </Disk>"""
 
 
-def get_links_from_html(content_to_parse: str) -> list[str]:
-    """ Returns links to products """
+# Attributes of a start tag: name, optionally followed by a double-quoted, single-quoted or unquoted value
+_ATTRIBUTE_REGEX = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
 
-    soup = BeautifulSoup(content_to_parse, features='html.parser')
+
+@lru_cache
+def _start_tag_regex(tag: str, binary: bool = False) -> re.Pattern:
+    """ Returns compiled regex which matches start tags with the given name, skipping comments and scripts """
+
+    pattern = (
+        r'''<!--.*?-->|<script\b(?:[^>"']|"[^"]*"|'[^']*')*>.*?</script\s*>|'''
+        r'''<''' + re.escape(tag) + r'''(?=[\s/>])((?:[^>"']|"[^"]*"|'[^']*')*)>'''
+    )
+
+    return re.compile(pattern.encode() if binary else pattern, re.DOTALL | re.IGNORECASE)
+
+
+def _iter_start_tags(content_to_parse: str | bytes, tag: str) -> Generator[dict[str, str | None], None, None]:
+    """
+        Yields attributes of each <tag> in the document without building a tree.
+        Attribute names are lowercased and values are unescaped the same way BeautifulSoup does it,
+        in case of duplicated attributes the last one wins.
+        The document can be passed as bytes to skip decoding, attributes are decoded as UTF-8 then.
+    """
+
+    binary = isinstance(content_to_parse, bytes)
+
+    for match in _start_tag_regex(tag, binary).finditer(content_to_parse):
+        raw_attributes = match.group(1)
+
+        if raw_attributes is None:  # Comment or script, nothing to look for inside
+            continue
+
+        if binary:
+            raw_attributes = raw_attributes.decode('utf-8', errors='replace')
+
+        attributes = {}
+        for name, double_quoted, single_quoted, unquoted in _ATTRIBUTE_REGEX.findall(raw_attributes):
+            value = double_quoted or single_quoted or unquoted
+            attributes[name.lower()] = unescape(value) if value else value
+
+        yield attributes
+
+
+@traced
+def get_links_from_html(content_to_parse: str | bytes) -> list[str]:
+    """ Returns links to products """
 
     links = []
 
-    for link in soup.find_all('a', class_='bull-item__self-link'):
-        links.append(
-            link.get('href')
-        )
+    for attributes in _iter_start_tags(content_to_parse, 'a'):
+        if 'bull-item__self-link' in (attributes.get('class') or '').split():
+            links.append(
+                attributes.get('href')
+            )
 
     return links
 
 
-def get_number_of_items(content_to_parse: str) -> tuple[int, int]:
+@traced
+def get_number_of_items(content_to_parse: str | bytes) -> tuple[int, int]:
     """ Returns a total number of items and number of pages """
 
-    soup = BeautifulSoup(content_to_parse, features='html.parser')
-    span = soup.find('span', {'id': 'itemsCount_placeholder'})
+    span = next((
+        attributes for attributes in _iter_start_tags(content_to_parse, 'span')
+        if attributes.get('id') == 'itemsCount_placeholder'
+    ), None)
 
     number_of_items = int(span.get('data-count'))
     return number_of_items, math.ceil(number_of_items / 50)
 
 
+def _process_parsed_string(string: str | None) -> str | None:
+    """ Removes extra symbols from str """
+
+    if string is None:
+        return
+
+    return string.replace('\n', '').replace('\t', '').replace('\xa0', '')
+
+
+def _get_integer_from_string(string: str) -> int:
+    """ Returns a string contains only integers from original string """
+
+    return int(re.search(r'\d+', string).group())
+
+
+class Field(NamedTuple):
+    """
+        Declares how a record attribute is extracted from an element with `data-field` attribute.
+        Args:
+            data_field: Value of `data-field` attribute of the element
+            attribute: Name of the record attribute
+            tag: Tag name of the element
+            required: Raise AttributeError if the element is not found
+            index: Index of the element among the elements with the same `data-field`
+                (index of `div.value` inside the first element if source is 'values')
+            source: 'text' for the element text, 'values' for texts of nested `div.value`,
+                any other value is a name of the element attribute
+            process: Function to post-process extracted string
+    """
+
+    data_field: str
+    attribute: str
+    tag: str = 'span'
+    required: bool = True
+    index: int = 0
+    source: str = 'text'
+    process: Callable[[str | None], str | None] | None = _process_parsed_string
+
+
+class Schema(NamedTuple):
+    """ Declares a record type and fields to extract it from an item page """
+
+    record: type
+    fields: tuple[Field, ...]
+    post_process: Callable[[dict], dict] | None = None
+
+
+class _Text:
+    """ Accumulates text parts of a captured element """
+
+    def __init__(self):
+        self.parts: list[str] = []
+
+    def __str__(self):
+        return ''.join(self.parts)
+
+
+class _Element(_Text):
+    """ Captured element with its attributes, text and texts of nested `div.value` """
+
+    def __init__(self, attributes: dict[str, str | None]):
+        super().__init__()
+        self.attributes = attributes
+        self.values: list[_Text] = []
+
+
+# Embedded JSON with item parameters for mmy.txt
+_MMY_PARAMS_REGEX = re.compile(r'Number\(\d+\), (.*?)\);', re.DOTALL)
+
+
+class _ItemPageScanner(HTMLParser):
+    """ Collects elements with `data-field` attribute and breadcrumbs in a single pass """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+        self.elements: dict[tuple[str, str], list[_Element]] = {}
+        self.breadcrumbs: _Text | None = None
+
+        # Open captures: [tag, depth of the same nested tags, captured text, is it a data-field element]
+        self._captures: list[list] = []
+
+    def handle_starttag(self, tag, attrs):
+        for capture in self._captures:
+            if capture[0] == tag:
+                capture[1] += 1
+
+        attributes = dict(attrs)
+
+        if 'data-field' in attributes:
+            element = _Element(attributes)
+            self.elements.setdefault((tag, attributes['data-field']), []).append(element)
+            self._captures.append([tag, 1, element, True])
+
+        if tag == 'div':
+            if attributes.get('id') == 'breadcrumbs' and self.breadcrumbs is None:
+                self.breadcrumbs = _Text()
+                self._captures.append([tag, 1, self.breadcrumbs, False])
+
+            if 'value' in (attributes.get('class') or '').split():
+                value = _Text()
+                for capture in self._captures:
+                    if capture[3]:
+                        capture[2].values.append(value)
+                self._captures.append([tag, 1, value, False])
+
+    def handle_endtag(self, tag):
+        for capture in self._captures:
+            if capture[0] == tag:
+                capture[1] -= 1
+
+        self._captures = [capture for capture in self._captures if capture[1] > 0]
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture[2].parts.append(data)
+
+
+class ItemPage(NamedTuple):
+    """ Everything extracted from an item page in a single pass """
+
+    elements: dict[tuple[str, str], list[_Element]]
+    breadcrumbs: str | None
+
+    @property
+    def item_type(self) -> ItemType | None:
+        """ Returns the type of item """
+
+        if self.breadcrumbs is None:
+            raise AttributeError('div#breadcrumbs is not found on the item page')
+
+        if re.search(r'\nДиски\n', self.breadcrumbs):
+            return ItemType.DISK
+        elif re.search(r'\nШины\n', self.breadcrumbs):
+            return ItemType.TIRE
+        else:
+            return
+
+    def get(self, field: Field) -> str | None:
+        """ Returns raw value of the field or None if it is not presented on the page """
+
+        elements = self.elements.get((field.tag, field.data_field), [])
+
+        try:
+            if field.source == 'text':
+                return str(elements[field.index])
+            elif field.source == 'values':
+                return str(elements[0].values[field.index])
+            else:
+                return elements[field.index].attributes.get(field.source)
+        except IndexError:
+            return
+
+    @traced
+    def to_record(self, schema: Schema, item_id: str | None = None):
+        """ Returns a record built from the page by schema """
+
+        values = {'item_id': item_id}
+
+        for field in schema.fields:
+            value = self.get(field)
+
+            if value is None and field.required:
+                raise AttributeError(
+                    f'Required field {field.tag}[data-field={field.data_field}][{field.index}] is not found'
+                )
+
+            values[field.attribute] = field.process(value) if field.process else value
+
+        if schema.post_process:
+            values = schema.post_process(values)
+
+        return schema.record(**values)
+
+
+@traced
+def scan_item_page(content_to_parse: str) -> ItemPage:
+    """ Returns all the data of item page collected in a single pass """
+
+    scanner = _ItemPageScanner()
+    scanner.feed(content_to_parse)
+    scanner.close()
+
+    return ItemPage(
+        elements=scanner.elements,
+        breadcrumbs=str(scanner.breadcrumbs) if scanner.breadcrumbs is not None else None
+    )
+
+
 def resolve_item_type(content_to_parse: str) -> ItemType | None:
     """ Returns the type of item """
 
-    soup = BeautifulSoup(content_to_parse, features='html.parser')
-    div = soup.find('div', {'id': 'breadcrumbs'})
-
-    if re.search(r'\nДиски\n', div.text):
-        return ItemType.DISK
-    elif re.search(r'\nШины\n', div.text):
-        return ItemType.TIRE
-    else:
-        return
+    return scan_item_page(content_to_parse).item_type
 
 
 def get_item_id(link: str) -> str:
@@ -209,193 +452,268 @@ def get_item_id(link: str) -> str:
     return result[0][:-5]  # Return first match without .html
 
 
+@traced
 def get_item_params_for_mmy_request(content_to_parse: str) -> dict:
     """ Returns item parameters from <script> for sending them to mmy.txt """
 
-    result = re.split(r'Number\(\d+\), ', content_to_parse)
-    result = re.split(r'\);', result[1])
+    match = _MMY_PARAMS_REGEX.search(content_to_parse)
 
-    return json.loads(result[0])
+    if match is None:
+        raise IndexError('Item parameters are not found on the page')
 
+    return json.loads(match.group(1))
 
-def _process_parsed_string(string: str | None) -> str | None:
-    """ Removes extra symbols from str """
 
-    if string is None:
-        return
+# Parts of the item page which change without changes of the item itself
+_VOLATILE_REGEX = re.compile(
+    rb'''<script\b.*?</script\s*>|<!--.*?-->|'''
+    rb'''<(\w+)[^>]*class="[^"]*(?:views|counter|banner|adv)[^"]*"[^>]*>.*?</\1\s*>|'''
+    rb'''\s+''',
+    re.DOTALL | re.IGNORECASE
+)
 
-    return string.replace('\n', '').replace('\t', '').replace('\xa0', '')
+# Name of the opening tag
+_TAG_NAME_REGEX = re.compile(rb'<(\w+)')
 
 
-def _get_integer_from_string(string: str) -> int:
-    """ Returns a string contains only integers from original string """
+def _find_element_end(content: bytes, position: int) -> int:
+    """ Returns position after the closing tag of the element which opening tag contains the position """
 
-    return int(re.search(r'\d+', string).group())
+    tag_start = content.rfind(b'<', 0, position)
+    name = _TAG_NAME_REGEX.match(content, tag_start)
 
+    if name is None:
+        return len(content)
 
-def parse_tire(content_to_parse: str) -> Tire:
-    """ Returns Tire dataclass after html parsing """
+    # Elements with the same name may be nested into the element, e.g. paragraphs of the description into a div
+    tag_regex = re.compile(rb'<(/?)' + re.escape(name.group(1)) + rb'\b[^>]*?(/?)>', re.IGNORECASE)
+    depth = 0
 
-    soup = BeautifulSoup(content_to_parse, features='html.parser')
+    for tag in tag_regex.finditer(content, tag_start):
+        if tag.group(1):
+            depth -= 1
+        elif not tag.group(2):  # Not self-closing
+            depth += 1
 
-    title = soup.find('span', {'data-field': 'subject'}).text
+        if depth <= 0:
+            return tag.end()
 
-    try:
-        price_for_set = soup.find('span', {'data-field': 'price'}).get('data-bulletin-price')
-    except AttributeError:
-        price_for_set = None
+    return len(content)
 
-    try:
-        the_number_of_tires_in_an_indivisible_set = soup.find('span', {'data-field': 'inSetQuantity'}).text
-    except AttributeError:
-        the_number_of_tires_in_an_indivisible_set = None
 
-    if price_for_set and the_number_of_tires_in_an_indivisible_set:
-        price = str(int(price_for_set) / _get_integer_from_string(the_number_of_tires_in_an_indivisible_set))
-    else:
-        price = price_for_set
+@traced
+def fingerprint_item_page(content_to_parse: str) -> str | None:
+    """
+        Returns fingerprint of the bulletin body: the part of the page from the first element
+        with `data-field` attribute to the end of the last one without scripts, comments, counters and ads.
+        The page is taken as decoded text, so the fingerprint does not depend on the encoding of the response.
+        Returns None if there are no fields on the page.
+    """
 
-    total_sets = soup.find('span', {'data-field': 'quantity'}).text
+    content = content_to_parse.encode()
+    start = content.find(b'data-field=')
 
-    try:
-        tire_year = soup.find('span', {'data-field': 'year'}).text
-    except AttributeError:
-        tire_year = None
+    if start == -1:
+        return
 
-    tread = soup.find('span', {'data-field': 'wheelSeason'}).text
-    product_condition = soup.find('span', {'data-field': 'condition'}).text
+    end = _find_element_end(content, content.rfind(b'data-field='))
+    body = content[start:end]
+
+    return hashlib.blake2b(_VOLATILE_REGEX.sub(b'', body), digest_size=16).hexdigest()
+
+
+def _price_per_item(quantity_attribute: str) -> Callable[[dict], dict]:
+    """ Returns post-processor which divides price for a set by number of items in the set """
+
+    def post_process(values: dict) -> dict:
+        price_for_set, quantity = values['price'], values[quantity_attribute]
+
+        if price_for_set and quantity:
+            values['price'] = str(int(price_for_set) / _get_integer_from_string(quantity))
+
+        return values
+
+    return post_process
+
+
+TIRE_SCHEMA = Schema(
+    record=Tire,
+    fields=(
+        Field('subject', 'title'),
+        Field('price', 'price', required=False, source='data-bulletin-price', process=None),
+        Field('inSetQuantity', 'the_number_of_tires_in_an_indivisible_set', required=False),
+        Field('quantity', 'total_sets'),
+        Field('year', 'tire_year', required=False),
+        Field('wheelSeason', 'tread'),
+        Field('condition', 'product_condition'),
+        Field('marking', 'landing_diameter', index=1),
+        Field('marking', 'profile_width', index=2),
+        Field('marking', 'profile_height', index=3),
+        Field('marking', 'frame', index=4),
+        Field('goodPresentState', 'availability_of_goods'),
+        Field('predestination', 'tire_type'),
+        Field('text', 'description', tag='p', required=False, process=None)
+    ),
+    post_process=_price_per_item('the_number_of_tires_in_an_indivisible_set')
+)
+
+DISK_SCHEMA = Schema(
+    record=Disk,
+    fields=(
+        Field('subject', 'title'),
+        Field('price', 'price', required=False, source='data-bulletin-price', process=None),
+        Field('inSetQuantity', 'number_of_discs_included', required=False),
+        Field('quantity', 'number_of_sets'),
+        Field('condition', 'product_condition', required=False),
+        Field('wheelDiameter', 'diameter'),
+        Field('discParameters', 'disc_width', tag='div', required=False, index=0, source='values'),
+        Field('discParameters', 'departure_ET', tag='div', required=False, index=1, source='values'),
+        Field('wheelPcd', 'drilling_PCD'),
+        Field('diskType', 'type_of', required=False),
+        Field('diskHoleDiameter', 'CH_diameter_DIA', required=False),
+        Field('goodPresentState', 'product_availability', required=False),
+        Field('text', 'description', tag='p', required=False, process=None)
+    ),
+    post_process=_price_per_item('number_of_discs_included')
+)
+
+SCHEMAS = {
+    ItemType.TIRE: TIRE_SCHEMA,
+    ItemType.DISK: DISK_SCHEMA
+}
+
+# Changes with any change of the schemas or the extractors, records extracted by another version are not reused
+EXTRACTOR_VERSION = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8).hexdigest()
+
+
+class CatalogCard(NamedTuple):
+    """ Fields of the item shown on the catalog page """
+
+    path: str
+    title: str
+    price: str | None
+    annotation: str | None  # Sizes, condition, availability, etc.
 
-    marking = soup.find_all('span', {'data-field': 'marking'})
-    landing_diameter = marking[1].text
-    profile_width = marking[2].text
-    profile_height = marking[3].text
-    frame = marking[4].text
+    @property
+    def fingerprint(self) -> str:
+        """ Returns hash of the card fields to notice changes of the item without visiting its page """
 
-    availability_of_goods = soup.find('span', {'data-field': 'goodPresentState'}).text
-    tire_type = soup.find('span', {'data-field': 'predestination'}).text
+        fields = '\x1f'.join(' '.join((value or '').split()) for value in (self.title, self.price, self.annotation))
+        return hashlib.blake2b(fields.encode(), digest_size=16).hexdigest()
 
-    try:
-        description = soup.find('p', {'data-field': 'text'}).text
-    except AttributeError:
-        description = None
-
-    return Tire(
-        title=_process_parsed_string(title),
-        price=price,
-        the_number_of_tires_in_an_indivisible_set=_process_parsed_string(the_number_of_tires_in_an_indivisible_set),
-        total_sets=_process_parsed_string(total_sets),
-        tire_year=_process_parsed_string(tire_year),
-        tread=_process_parsed_string(tread),
-        product_condition=_process_parsed_string(product_condition),
-        landing_diameter=_process_parsed_string(landing_diameter),
-        profile_width=_process_parsed_string(profile_width),
-        profile_height=_process_parsed_string(profile_height),
-        frame=_process_parsed_string(frame),
-        availability_of_goods=_process_parsed_string(availability_of_goods),
-        tire_type=_process_parsed_string(tire_type),
-        description=description
-    )
 
+class _CatalogScanner(HTMLParser):
+    """
+        Collects cards of the catalog items in a single pass.
+        A card starts with the item link, the price and annotation elements after it belong to the same card.
+    """
 
-def parse_disk(content_to_parse: str) -> Disk:
-    """ Returns Disk dataclass after html parsing """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
 
-    soup = BeautifulSoup(content_to_parse, features='html.parser')
+        self.cards: list[dict[str, str | _Text | list[_Text]]] = []
 
-    title = soup.find('span', {'data-field': 'subject'}).text
+        # Open captures: [tag, depth of the same nested tags, captured text]
+        self._captures: list[list] = []
 
-    try:
-        price_for_set = soup.find('span', {'data-field': 'price'}).get('data-bulletin-price')
-    except AttributeError:
-        price_for_set = None
+    def handle_starttag(self, tag, attrs):
+        for capture in self._captures:
+            if capture[0] == tag:
+                capture[1] += 1
 
-    try:
-        number_of_discs_included = soup.find('span', {'data-field': 'inSetQuantity'}).text
-    except AttributeError:
-        number_of_discs_included = None
+        attributes = dict(attrs)
+        classes = (attributes.get('class') or '').split()
 
-    if price_for_set and number_of_discs_included:
-        price = str(int(price_for_set) / _get_integer_from_string(number_of_discs_included))
-    else:
-        price = price_for_set
+        if tag == 'a' and 'bull-item__self-link' in classes:
+            card = {'path': attributes.get('href'), 'title': _Text(), 'price': None, 'annotation': []}
+            self.cards.append(card)
+            self._captures.append([tag, 1, card['title']])
+        elif self.cards:
+            card = self.cards[-1]
 
-    number_of_sets = soup.find('span', {'data-field': 'quantity'}).text
+            if card['price'] is None and (attributes.get('data-role') == 'price' or 'price-block__price' in classes):
+                card['price'] = _Text()
+                self._captures.append([tag, 1, card['price']])
+            elif 'bull-item__annotation-row' in classes:
+                card['annotation'].append(_Text())
+                self._captures.append([tag, 1, card['annotation'][-1]])
 
-    try:
-        product_condition = soup.find('span', {'data-field': 'condition'}).text
-    except AttributeError:
-        product_condition = None
-        
-    diameter = soup.find('span', {'data-field': 'wheelDiameter'}).text
+    def handle_endtag(self, tag):
+        for capture in self._captures:
+            if capture[0] == tag:
+                capture[1] -= 1
 
-    try:
-        disk_parameters = soup.find('div', {'data-field': 'discParameters'}).select('div.value')
-    except AttributeError:
-        disk_parameters = None
+        self._captures = [capture for capture in self._captures if capture[1] > 0]
 
-    try:
-        disc_width = disk_parameters[0].text
-    except (IndexError, TypeError):
-        disc_width = None
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture[2].parts.append(data)
 
-    try:
-        departure_ET = disk_parameters[1].text
-    except (IndexError, TypeError):
-        departure_ET = None
 
-    drilling_PCD = soup.find('span', {'data-field': 'wheelPcd'}).text
+@traced
+def get_cards_from_html(content_to_parse: str) -> list[CatalogCard]:
+    """ Returns cards of the items on the catalog page or in the feed """
 
-    try:
-        type_of = soup.find('span', {'data-field': 'diskType'}).text
-    except AttributeError:
-        type_of = None
+    scanner = _CatalogScanner()
+    scanner.feed(content_to_parse)
+    scanner.close()
 
-    try:
-        CH_diameter_DIA = soup.find('span', {'data-field': 'diskHoleDiameter'}).text
-    except AttributeError:
-        CH_diameter_DIA = None
+    return [
+        CatalogCard(
+            path=card['path'],
+            title=_process_parsed_string(str(card['title'])),
+            price=_process_parsed_string(str(card['price'])) if card['price'] is not None else None,
+            annotation='\n'.join(
+                _process_parsed_string(str(row)) for row in card['annotation']
+            ) if card['annotation'] else None
+        )
+        for card in scanner.cards
+    ]
 
-    try:
-        product_availability = soup.find('span', {'data-field': 'goodPresentState'}).text
-    except AttributeError:
-        product_availability = None
+
+@traced
+def parse_item_page(content_to_parse: str, item_id: str | None = None) -> tuple[ItemType | None, dict | None, float,
+                                                                                str | None]:
+    """
+        Returns item type, record of the item page if it is a tire or a disk, CPU time spent
+        and traceback of the extraction if it has failed, so a single broken page does not stop the crawl.
+        Runs in parse pool processes, so the record is returned as a dictionary as records can not be pickled.
+    """
+
+    started_at = time.process_time()
 
     try:
-        description = soup.find('p', {'data-field': 'text'}).text
-    except AttributeError:
-        description = None
-
-    return Disk(
-        title=_process_parsed_string(title),
-        price=price,
-        number_of_discs_included=_process_parsed_string(number_of_discs_included),
-        number_of_sets=_process_parsed_string(number_of_sets),
-        product_condition=_process_parsed_string(product_condition),
-        diameter=_process_parsed_string(diameter),
-        disc_width=_process_parsed_string(disc_width),
-        departure_ET=_process_parsed_string(departure_ET),
-        drilling_PCD=_process_parsed_string(drilling_PCD),
-        type_of=_process_parsed_string(type_of),
-        CH_diameter_DIA=_process_parsed_string(CH_diameter_DIA),
-        product_availability=_process_parsed_string(product_availability),
-        description=description
-    )
+        item_page = scan_item_page(content_to_parse)  # All the data of item page in a single pass
+        item_type = item_page.item_type
+        record = item_page.to_record(SCHEMAS[item_type], item_id=item_id) if item_type in SCHEMAS else None
+    except Exception:
+        return None, None, time.process_time() - started_at, traceback.format_exc()
 
+    return item_type, record.__dict__() if record is not None else None, time.process_time() - started_at, None
 
-def is_captcha_in_response(content_to_parse: str) -> bool:
-    """ Returns True if captcha is in the response, otherwise returns False """
 
-    soup = BeautifulSoup(content_to_parse, features='html.parser')
+def parse_tire(content_to_parse: str) -> Tire:
+    """ Returns Tire dataclass after html parsing """
 
-    try:
-        _ = soup.find('input', {'name': 's'}).get('value')
-        _ = soup.find('input', {'name': 't'}).get('value')
+    return scan_item_page(content_to_parse).to_record(TIRE_SCHEMA)
 
-        return True
-    except AttributeError:
-        return False
+
+def parse_disk(content_to_parse: str) -> Disk:
+    """ Returns Disk dataclass after html parsing """
+
+    return scan_item_page(content_to_parse).to_record(DISK_SCHEMA)
+
+
+@traced
+def is_captcha_in_response(content_to_parse: str | bytes) -> bool:
+    """ Returns True if captcha is in the response, otherwise returns False """
+
+    names = {attributes.get('name') for attributes in _iter_start_tags(content_to_parse, 'input')}
+
+    return {'s', 't'} <= names
 
 
+@traced
 def resolve_captcha_type(content_to_parse: str) -> CaptchaType:
     """ Returns CaptchaType in dependency on captcha presented in the response """
 
@@ -408,6 +726,7 @@ def resolve_captcha_type(content_to_parse: str) -> CaptchaType:
         return CaptchaType.RECAPTCHA
 
 
+@traced
 def get_captcha_hidden_inputs(content_to_parse: str) -> tuple[str, str, str | None]:
     """ Returns hidden_s, hidden_t inputs and image_url to submit and solve captcha """
 
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import time
+from typing import Generator, NamedTuple
+from core.settings import BASE_DIR
+
+
+class QuarantinedItem(NamedTuple):
+    item_id: str
+    link_id: str
+    path: str  # Path of the item page
+    content: str  # Item page as it has been received
+    error: str  # Traceback of the failed extraction
+    quarantined_at: float  # Unix timestamp
+
+
+class Quarantine:
+    """
+        Item pages which extraction has failed with their tracebacks.
+        The crawl continues without them, reparse.py runs the extractors over them again after a fix.
+        Shared between parser processes, so it is stored in SQLite which handles concurrent writers.
+    """
+
+    def __init__(self, filename: str = os.path.join(BASE_DIR, 'tmp/quarantine.sqlite3')):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        self._connection = sqlite3.connect(filename, timeout=60)
+        self._connection.execute(
+            """
+                CREATE TABLE IF NOT EXISTS items (
+                    item_id TEXT PRIMARY KEY,
+                    link_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    error TEXT NOT NULL,
+                    quarantined_at REAL NOT NULL
+                )
+            """
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def put(self, item_id: str, link_id: str, path: str, content: str, error: str) -> None:
+        """ Adds or replaces the item page which extraction has failed """
+
+        self._connection.execute(
+            'INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)',
+            (item_id, link_id, path, content, error, time.time())
+        )
+        self._connection.commit()
+
+    def remove(self, item_id: str) -> None:
+        self._connection.execute('DELETE FROM items WHERE item_id = ?', (item_id,))
+        self._connection.commit()
+
+    def iter_items(self, link_id: str | None = None) -> Generator[QuarantinedItem, None, None]:
+        """ Yields quarantined items of the link or of all the links in the order of quarantining """
+
+        query = 'SELECT item_id, link_id, path, content, error, quarantined_at FROM items'
+        parameters = ()
+
+        if link_id:
+            query += ' WHERE link_id = ?'
+            parameters = (link_id,)
+
+        # Fetched before yielding, so the items can be removed while iterating
+        for row in self._connection.execute(query + ' ORDER BY quarantined_at', parameters).fetchall():
+            yield QuarantinedItem(*row)
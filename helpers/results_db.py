@@ -0,0 +1,142 @@
+import os
+import sqlite3
+from helpers.export import COLUMNS, Column, to_columns
+from helpers.parse_html import Tire, Disk
+
+
+# Tables by record type
+TABLES = {
+    Tire: 'tires',
+    Disk: 'disks'
+}
+
+# Indexed lookups of each table besides the common ones by item, seller link, url and crawl time
+_INDEXES = {
+    'tires': (
+        ('landing_diameter', 'profile_width', 'profile_height'),
+        ('price',)
+    ),
+    'disks': (
+        ('diameter',),
+        ('pcd_holes', 'pcd_diameter'),
+        ('price',)
+    )
+}
+
+_SQL_TYPES = {str: 'TEXT', int: 'INTEGER', float: 'REAL'}
+
+
+def _table_columns(record_type: type) -> tuple[Column, ...]:
+    # item_id is one of the common columns
+    return tuple(column for column in COLUMNS[record_type] if column.name != 'item_id')
+
+
+class ResultsDatabase:
+    """
+        Records of all the runs with typed columns of the columnar export.
+        Each run adds its records, so the history of prices and availability is kept.
+    """
+
+    def __init__(self, filename: str):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        self._connection = sqlite3.connect(filename, timeout=60)
+
+        for record_type, table in TABLES.items():
+            columns = ', '.join(
+                f'{column.name} {_SQL_TYPES[column.type]}' for column in _table_columns(record_type)
+            )
+            self._connection.execute(
+                f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        link_id TEXT NOT NULL,
+                        crawled_at REAL NOT NULL,
+                        item_id TEXT,
+                        url TEXT,
+                        {columns}
+                    )
+                """
+            )
+
+            # link_id is the seller as each link is a seller catalog
+            common = (('item_id', 'crawled_at'), ('link_id', 'crawled_at'), ('url',), ('crawled_at',))
+
+            for indexed_columns in common + _INDEXES[table]:
+                self._connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{"_".join(indexed_columns)} '
+                    f'ON {table} ({", ".join(indexed_columns)})'
+                )
+
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def add(self, link_id: str, crawled_at: float, records: list[Tire | Disk], record_type: type,
+            urls: dict[str, str]) -> None:
+        """
+            Adds records of the run.
+            Args:
+                link_id: Id of the parsed link from input/links.csv
+                crawled_at: Unix timestamp of the run
+                records: Tire or Disk records
+                record_type: Tire or Disk
+                urls: URLs of the items by item id
+        """
+
+        definitions = _table_columns(record_type)
+        columns = to_columns(records, definitions)
+        item_ids = [record.item_id for record in records]
+
+        rows = zip(
+            [link_id] * len(records),
+            [crawled_at] * len(records),
+            item_ids,
+            [urls.get(item_id) for item_id in item_ids],
+            *(columns[column.name] for column in definitions)
+        )
+
+        self._connection.executemany(
+            f'INSERT INTO {TABLES[record_type]} VALUES ({", ".join("?" * (4 + len(definitions)))})', rows
+        )
+        self._connection.commit()
+
+    def find(self, record_type: type, conditions: list[tuple[str, str, object]], latest: bool = True,
+             limit: int | None = None) -> tuple[list[str], list[tuple]]:
+        """
+            Returns names of the columns and the records matching all the conditions ordered by price.
+            Args:
+                record_type: Tire or Disk
+                conditions: Column names, operators and values, e.g. [('price', '<=', 10000)]
+                latest: Return only the last crawled record of each item, the records of all the runs otherwise
+                limit: Maximum number of records
+        """
+
+        table = TABLES[record_type]
+        names = ['link_id', 'crawled_at', 'item_id', 'url'] + [column.name for column in _table_columns(record_type)]
+        where, parameters = [], []
+
+        for name, operator, value in conditions:
+            assert name in names, f'Unknown column {name}'
+            assert operator in ('=', '<', '<=', '>', '>=', 'LIKE'), f'Unknown operator {operator}'
+
+            where.append(f'{table}.{name} {operator} ?')
+            parameters.append(value)
+
+        if latest:
+            where.append(
+                f'{table}.crawled_at = (SELECT MAX(crawled_at) FROM {table} AS t WHERE t.item_id = {table}.item_id)'
+            )
+
+        query = f'SELECT {", ".join(names)} FROM {table}'
+
+        if where:
+            query += f' WHERE {" AND ".join(where)}'
+
+        query += ' ORDER BY price IS NULL, price'
+
+        if limit:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+
+        return names, self._connection.execute(query, parameters).fetchall()
@@ -1,9 +1,30 @@
 import argparse
 import logging
+import os
+import socket
 import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
 from multiprocessing import Process
+from core.coordination import LeaseKeeper, LeaseLost, get_lease_backend, serve_leases
+from core.daemon import Daemon
+from core.scheduler import estimate_run_duration
+from core.supervisor import Heartbeat, Supervisor
 from core.proxy import Proxy, load_proxies
 from core.link import Link, load_links
+from core.settings import (
+    LEASE_TTL_IN_SECONDS,
+    LEASE_MAX_ATTEMPTS,
+    COORDINATOR_AUTHKEY,
+    CRAWL_TIME_BUDGET_IN_MINUTES,
+    PARSE_WORKERS,
+    MASTER_FEED,
+    BASE_DIR,
+    DAEMON_STATUS_ADDRESS
+)
+from helpers.merge import merge_spills
 from parser import Parser
 
 
@@ -14,10 +35,36 @@ PROXIES = load_proxies()
 LINKS = load_links()
 
 
-def run_parser(link_id: str, proxy_id: str):
+def _parse_workers(number_of_parsers: int) -> int:
+    """ Returns number of parse processes of each parser to share the cores between parsers running at once """
+
+    return PARSE_WORKERS or max(1, (os.cpu_count() or 1) // number_of_parsers)
+
+
+def parse_link(link: Link, proxy: Proxy, deadline: float | None = None, heartbeat: Heartbeat | None = None,
+               parse_workers: int | None = None, lease_lost: threading.Event | None = None):
+    """
+        Parses the link using the proxy, stops before the deadline (unix timestamp) if it is passed.
+        Raises LeaseLost without saving the output if lease_lost is set while parsing.
+    """
+
+    with Parser(_id=link.id,
+                base_url=link.url,
+                from_link=link.from_item,
+                proxy=proxy,
+                deadline=deadline,
+                heartbeat=heartbeat,
+                parse_workers=parse_workers,
+                lease_lost=lease_lost) as parser:
+        parser.run()
+
+
+def run_parser(link_id: str, proxy_id: str, deadline: float | None = None, heartbeat: Heartbeat | None = None,
+               parse_workers: int | None = None, lease_lost: threading.Event | None = None):
     """
         Starts a single parser for link with id=link_id from input/links.csv
-        using proxy with id=proxy_id from input/proxies.csv
+        using proxy with id=proxy_id from input/proxies.csv.
+        The parser stops before the deadline (unix timestamp) if it is passed.
     """
 
     # Check link_id parameter
@@ -33,22 +80,114 @@ def run_parser(link_id: str, proxy_id: str):
     proxy = filtered[0]
 
     # Run parser
-    with Parser(_id=link_id,
-                base_url=link.url,
-                from_link=link.from_item,
-                proxy=proxy) as parser:
-        parser.run()
+    parse_link(link, proxy, deadline=deadline, heartbeat=heartbeat, parse_workers=parse_workers, lease_lost=lease_lost)
 
 
-def run_parsers():
-    """ Starts all parsers for each link from input/links.csv """
+def run_parsers(deadline: float | None = None):
+    """
+        Starts all parsers for each link from input/links.csv.
+        Crashed parsers are restarted by the supervisor and continue from their checkpoints.
+    """
 
     assert len(PROXIES) >= len(LINKS), 'Number of proxies in input/proxies.csv ' \
                                        'must be more or equal than number of links in input/links.csv'
 
-    processes = []
+    estimated = estimate_run_duration(link.id for link in LINKS)
+    logger.info(f'Estimated run duration: {timedelta(seconds=round(estimated))}')
+
+    if deadline and time.time() + estimated > deadline:
+        logger.warning('Not all the items are expected to be parsed within the time budget')
+
+    started_at = time.time()
+    supervisor = Supervisor(
+        target=partial(run_parser, deadline=deadline, parse_workers=_parse_workers(len(LINKS))),
+        proxy_ids=[proxy.id for proxy in PROXIES],
+        deadline=deadline
+    )
+
     for link, proxy in zip(LINKS, PROXIES):
-        process = Process(target=run_parser, args=(link.id, proxy.id))
+        supervisor.add(link.id, proxy.id)
+
+    # Waiting for each parser to complete
+    crash_loop_links = supervisor.run()
+
+    if crash_loop_links:
+        logger.error(f'Links have not been parsed: {", ".join(crash_loop_links)}')
+
+    if MASTER_FEED:
+        merge_master_feed(since=started_at)
+
+
+def merge_master_feed(since: float | None = None):
+    """
+        Merges tires and disks of all the links from input/links.csv into output master feed files
+        sorted by item id without duplicates.
+        Records saved by the parsers before since (unix timestamp) are skipped if it is passed.
+    """
+
+    now = datetime.now().strftime('%Y-%m-%d_%H-%M')
+
+    for name in ('tires', 'disks'):
+        started_at = time.perf_counter()
+        filename = os.path.join(BASE_DIR, f'output/master_{now}_{name}.xml')
+        merged, duplicates = merge_spills(name, (link.id for link in LINKS), filename, since=since)
+
+        logger.info(
+            f'Master feed — {merged} {name} merged into {filename}, {duplicates} duplicates skipped '
+            f'in {time.perf_counter() - started_at:.2f}s'
+        )
+
+
+def run_worker(node_id: str, proxy_id: str, coordinator: str, run_id: str, deadline: float | None = None):
+    """
+        Claims links of the run from the coordinator one by one
+        and parses them using proxy with id=proxy_id from input/proxies.csv
+    """
+
+    backend = get_lease_backend(coordinator, authkey=COORDINATOR_AUTHKEY.encode())
+    worker_id = f'{node_id}/{proxy_id}'
+
+    while True:
+        lease = backend.claim(run_id, worker_id, ttl=LEASE_TTL_IN_SECONDS, max_attempts=LEASE_MAX_ATTEMPTS)
+
+        if lease is None:
+            if not backend.unfinished(run_id, max_attempts=LEASE_MAX_ATTEMPTS):
+                break
+
+            # Links are claimed by other nodes, wait for them to complete or for their leases to expire
+            time.sleep(LEASE_TTL_IN_SECONDS / 10)
+            continue
+
+        logger.debug(f'Worker {worker_id} — Claimed link {lease.link_id}, attempt {lease.attempts}')
+
+        with LeaseKeeper(backend, lease, ttl=LEASE_TTL_IN_SECONDS) as keeper:
+            try:
+                run_parser(link_id=lease.link_id, proxy_id=proxy_id, deadline=deadline,
+                           parse_workers=_parse_workers(len(PROXIES)), lease_lost=keeper.lost)
+            except LeaseLost as e:
+                logger.warning(f'Worker {worker_id} — {e}')
+            except Exception as e:
+                logger.exception(f'Worker {worker_id} — Link {lease.link_id} failed — {e}')
+                backend.release(lease)
+            else:
+                if keeper.lost.is_set():  # Lost after the last request, the output has not been saved
+                    logger.warning(f'Worker {worker_id} — Lease of link {lease.link_id} has been lost')
+                else:
+                    backend.complete(lease)
+
+
+def run_node(node_id: str, coordinator: str, run_id: str, deadline: float | None = None):
+    """
+        Starts a worker for each proxy from input/proxies.csv,
+        workers of all the nodes share links from input/links.csv through the coordinator
+    """
+
+    backend = get_lease_backend(coordinator, authkey=COORDINATOR_AUTHKEY.encode())
+    backend.register(run_id, [link.id for link in LINKS])
+
+    processes = []
+    for proxy in PROXIES:
+        process = Process(target=run_worker, args=(node_id, proxy.id, coordinator, run_id, deadline))
         processes.append(process)
         process.start()
 
@@ -56,6 +195,23 @@ def run_parsers():
     for process in processes:
         process.join()
 
+    failed = backend.failed(run_id, max_attempts=LEASE_MAX_ATTEMPTS)
+    if failed:
+        logger.error(f'Node {node_id} — Links failed after {LEASE_MAX_ATTEMPTS} attempts: {", ".join(failed)}')
+
+
+def run_daemon_link(link: Link, proxy: Proxy, heartbeat: Heartbeat | None = None):
+    """ Runs the link in daemon mode within the time budget of a single run """
+
+    deadline = time.time() + CRAWL_TIME_BUDGET_IN_MINUTES * 60 if CRAWL_TIME_BUDGET_IN_MINUTES else None
+    parse_link(link, proxy, deadline=deadline, heartbeat=heartbeat, parse_workers=_parse_workers(len(PROXIES)))
+
+
+def run_daemon():
+    """ Runs each link from input/links.csv on its schedule until SIGTERM or Ctrl+C """
+
+    Daemon(target=run_daemon_link, status_address=DAEMON_STATUS_ADDRESS).run()
+
 
 def main():
     """ Parser entrypoint """
@@ -65,13 +221,42 @@ def main():
     parser = argparse.ArgumentParser(description='Welcome to FarPost.ru parser')
     parser.add_argument('--link-id', type=str, help='Catalog link id to parse (id from input/links.csv)')
     parser.add_argument('--proxy-id', type=str, help='Proxy id to use (id from input/proxies.csv)')
+    parser.add_argument('--coordinator', type=str,
+                        help='Share links between nodes: sqlite:///path/to/leases.sqlite3 or manager://host:port')
+    parser.add_argument('--node-id', type=str, default=socket.gethostname(), help='Unique node id, hostname by default')
+    parser.add_argument('--run-id', type=str,
+                        help='Unique id of the run shared by all the nodes, required with --coordinator')
+    parser.add_argument('--time-budget', type=int, default=CRAWL_TIME_BUDGET_IN_MINUTES, metavar='MINUTES',
+                        help='Stop parsing before the time budget is over, 0 for no budget')
+    parser.add_argument('--serve-leases', type=str, metavar='HOST:PORT',
+                        help='Start a coordinator for manager://host:port')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Run each link on its schedule, reload input/*.csv on changes')
+    parser.add_argument('--merge', action='store_true',
+                        help='Merge the last saved tires and disks of all the links into the master feed')
     namespace = parser.parse_args(args)
 
+    deadline = time.time() + namespace.time_budget * 60 if namespace.time_budget else None
+
     # Verify arguments
-    if namespace.link_id and namespace.proxy_id:
-        run_parser(link_id=namespace.link_id, proxy_id=namespace.proxy_id)
+    if namespace.serve_leases:
+        host, port = namespace.serve_leases.rsplit(':', 1)
+        serve_leases(host, int(port), authkey=COORDINATOR_AUTHKEY.encode())
+    elif namespace.daemon:
+        run_daemon()
+    elif namespace.merge:
+        merge_master_feed()
+    elif namespace.coordinator:
+        if not namespace.run_id:
+            print('You need to specify --run-id parameter shared by all the nodes of the run', file=sys.stderr)
+            sys.exit(1)
+
+        run_node(node_id=namespace.node_id, coordinator=namespace.coordinator, run_id=namespace.run_id,
+                 deadline=deadline)
+    elif namespace.link_id and namespace.proxy_id:
+        run_parser(link_id=namespace.link_id, proxy_id=namespace.proxy_id, deadline=deadline)
     elif not namespace.link_id and not namespace.proxy_id:
-        run_parsers()
+        run_parsers(deadline=deadline)
     else:
         print(f'You need either to specify --link-id and --proxy-id parameters or do not specify both', file=sys.stderr)
         sys.exit(1)
@@ -4,45 +4,95 @@ import logging
 import pickle
 import random
 import requests
+import threading
 import time
+import traceback
+from collections import Counter
 from datetime import datetime
-from typing import Callable
+from typing import Callable, Generator, Iterable
 from shutil import rmtree
 from twocaptcha import TwoCaptcha
 from urllib.parse import urlencode, urljoin
-from user_agent import generate_user_agent
 from core.settings import (
     BASE_DIR,
     GOOGLE_SITE_KEY,
-    RUCAPTCHA_API_KEY
+    RUCAPTCHA_API_KEY,
+    REQUEST_CONNECT_TIMEOUT_IN_SECONDS,
+    REQUEST_READ_TIMEOUT_IN_SECONDS,
+    COLUMNAR_EXPORT_FORMAT,
+    DELTA_MODE,
+    DELTA_FULL_OUTPUT_EVERY_N_RUNS,
+    CHECKPOINT_EVERY_N_ITEMS,
+    PARSE_WORKERS,
+    PARSE_QUEUE_SIZE,
+    RESULTS_DATABASE,
+    INCREMENTAL_LISTING,
+    INCREMENTAL_LISTING_STOP_AFTER_N_KNOWN_PAGES,
+    LISTING_ONLY_MODE,
+    MASTER_FEED,
+    TRACE_SAMPLE_RATE
 )
 from core.proxy import Proxy, load_proxies
+from core.coordination import LeaseLost
+from core.bandwidth import ACCEPT_ENCODING, BandwidthMeter
+from core.frontier import Frontier
+from core.listing import ListingHistory
+from core.pool import OrderedPool
+from core.response import FarpostResponse
+from core.scheduler import CrawlScheduler
+from core.session_vault import Identity, SessionVault
+from core.supervisor import Heartbeat
+from core import tracing
+from core.tracing import span, traced, traced_call
+from core.retry import (
+    CircuitBreaker,
+    RetryStats,
+    ServerError,
+    RETRIABLE_ERRORS,
+    backoff_delay,
+    resolve_retry_policy
+)
 from helpers.parse_html import (
     ItemType,
     CaptchaType,
     Tire,
     Disk,
     get_links_from_html,
+    get_cards_from_html,
     get_number_of_items,
-    resolve_item_type,
     get_item_id,
     get_item_params_for_mmy_request,
-    parse_tire,
-    parse_disk,
+    fingerprint_item_page,
+    parse_item_page,
+    SCHEMAS,
     is_captcha_in_response,
     resolve_captcha_type,
     get_captcha_hidden_inputs
 )
+from helpers.delta import load_snapshot, save_snapshot, compute_delta, save_delta_to_xml
+from helpers.export import save_columnar
+from helpers.item_index import ItemIndex
+from helpers.merge import save_spill
+from helpers.quarantine import Quarantine
+from helpers.results_db import ResultsDatabase
 from helpers.send_email import send_email_with_attachments
 
 
 logger = logging.getLogger(__file__)
 
 
+def _lost_parse_result(exception: BaseException) -> tuple[tuple, list]:
+    """ Returns result of the parse task lost as its worker has died, so the page is quarantined """
+
+    return (None, None, 0.0, ''.join(traceback.format_exception(exception))), []
+
+
 class Parser:
     """ Base class for parsing farpost.ru """
 
-    def __init__(self, _id: str, base_url: str, proxy: Proxy, from_link: str = None):
+    def __init__(self, _id: str, base_url: str, proxy: Proxy, from_link: str = None, deadline: float | None = None,
+                 heartbeat: Heartbeat | None = None, parse_workers: int | None = None, save_output: bool = True,
+                 send_email: bool = True, lease_lost: threading.Event | None = None):
         assert isinstance(_id, str), '`_id` parameter must be a str instance'
         assert isinstance(base_url, str), '`base_url` parameter must be a str instance'
         assert isinstance(proxy, Proxy), '`proxy` parameter must be a Proxy instance'
@@ -50,10 +100,19 @@ class Parser:
         self._id = _id
         self._base_url = base_url
         self._from_link = from_link  # Item to start parse
+        self._heartbeat = heartbeat  # Sign of life for the supervisor
+        self._lease_lost = lease_lost  # Set when the link has been claimed by another node
+        self._save_output_enabled = save_output  # Output files and the results database
+        self._send_email_enabled = send_email
         self._session = requests.Session()
-        self._user_agent: str = generate_user_agent(device_type=['smartphone', 'tablet'])
         self._proxy = proxy
 
+        # User-agent and cookies of the proxy from the previous runs
+        self._vault = SessionVault()
+        self._identity: Identity = self._vault.acquire(proxy.id)
+        self._user_agent = self._identity.user_agent
+        self._session.cookies = self._identity.cookies
+
         # Dictionary for further using with requests
         self._proxies = {
             'http':
@@ -66,7 +125,7 @@ class Parser:
         self._user_headers = {
             'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,'
                       'image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
-            'accept-encoding': 'gzip, deflate, br',
+            'accept-encoding': ACCEPT_ENCODING,
             'accept-language': 'ru',
             'sec-ch-ua-mobile': '?1',
             'sec-fetch-dest': 'document',
@@ -81,7 +140,7 @@ class Parser:
         self._script_headers = {
             'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,'
                       'image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
-            'accept-encoding': 'gzip, deflate, br',
+            'accept-encoding': ACCEPT_ENCODING,
             'accept-language': 'ru',
             'sec-ch-ua-mobile': '?1',
             'sec-fetch-dest': 'empty',
@@ -91,13 +150,47 @@ class Parser:
             'user-agent': self._user_agent
         }
 
-        self._links = []  # Links to catalog items
+        self._timeout = (REQUEST_CONNECT_TIMEOUT_IN_SECONDS, REQUEST_READ_TIMEOUT_IN_SECONDS)
+        self._breakers: dict[str, CircuitBreaker] = {}  # Circuit breakers by proxy id
+        self._retry_stats = RetryStats()
+        self._bandwidth = BandwidthMeter()  # Traffic by proxy and request type
+
+        self._scheduler = CrawlScheduler(_id, deadline=deadline)  # Items order and time budget
+        self._is_complete = True  # False if the time budget is over before all the items have been parsed
+        self._is_full_listing = True  # False if the incremental listing has not visited all the catalog pages
+        self._is_finished = False  # True if the items have been parsed till the end or the time budget
+
+        self._item_index = ItemIndex()
+        self._index_hits = 0  # Items which have not changed since the last parsing
+        self._card_hits = 0  # Items which pages have not been visited as their catalog cards have not changed
+        self._quarantine = Quarantine()
+        self._quarantined = 0  # Items which extraction has failed during the run
+        self._parse_seconds_saved = 0.0
+
+        # Item pages are parsed in other processes while the next ones are fetched
+        parse_workers = parse_workers or PARSE_WORKERS or os.cpu_count()
+        self._parse_pool = OrderedPool(
+            max_workers=parse_workers, max_pending=PARSE_QUEUE_SIZE or 2 * parse_workers,
+            failure_result=_lost_parse_result
+        )
+        self._cpu_seconds = Counter()  # CPU time by stage
+        self._cpu_started_at = time.process_time()
+
+        # Links to catalog items, kept on disk as the catalog may be too large to keep them in memory
+        self._frontier = Frontier(os.path.join(BASE_DIR, f'tmp/parser_{self._id}/frontier.sqlite3'))
         self._tires: list[Tire] = []  # Tires parsed
         self._disks: list[Disk] = []  # Disks parsed
 
-        now = datetime.now().strftime('%Y%m%d_%H%M')
+        self._started_at = time.time()
+        now = datetime.fromtimestamp(self._started_at).strftime('%Y%m%d_%H%M')
         self._tires_filename = os.path.join(BASE_DIR, f'output/{self._id}_{now}_tires.xml')
+        self._bandwidth_filename = os.path.join(BASE_DIR, f'output/{self._id}_{now}_bandwidth.csv')
         self._disks_filename = os.path.join(BASE_DIR, f'output/{self._id}_{now}_disks.xml')
+        self._output_filenames: list[str] = []  # Output files to send by email
+
+        # Spans of the sampled catalog pages and items, the other ones cost a single check
+        self._trace_filename = os.path.join(BASE_DIR, f'output/{self._id}_{now}_trace.json')
+        self._tracer = tracing.start(TRACE_SAMPLE_RATE, link_id=self._id) if TRACE_SAMPLE_RATE else None
 
     def __enter__(self):
         self._load_catalog_links()
@@ -106,35 +199,125 @@ class Parser:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self._vault.save(self._identity)
+        self._vault.close()
+        logger.info(f'Parser {self._id} — Identity {self._identity}')
         self._session.close()
+        self._parse_pool.shutdown()
+        self._item_index.close()
+        self._quarantine.close()
+        self._scheduler.save()
+        self._cpu_seconds['fetch'] = time.process_time() - self._cpu_started_at - self._cpu_seconds['collect']
+        logger.info(f'Parser {self._id} — Requests {self._retry_stats}')
+        self._bandwidth.log(f'Parser {self._id} — Traffic')
+        self._bandwidth.save(self._bandwidth_filename, self._id)
+
+        if self._tracer is not None:
+            self._tracer.save(self._trace_filename, process_name=f'Parser {self._id}')
+            tracing.stop()
+            logger.info(f'Parser {self._id} — Trace of the sampled pages has been saved to {self._trace_filename}')
+
+        logger.info(
+            f'Parser {self._id} — {self._index_hits} unchanged items have not been parsed again, '
+            f'parse time saved: {self._parse_seconds_saved:.2f}s, '
+            f'{self._card_hits} item pages have not been visited as their catalog cards have not changed'
+        )
+
+        if self._quarantined:
+            logger.warning(
+                f'Parser {self._id} — Extraction of {self._quarantined} items has failed, '
+                f'their pages have been quarantined, run reparse.py after a fix'
+            )
 
-        if exc_type:
-            logger.exception(f'Parser {self._id} — {exc_val}')
-            self._dump_disks_to_tmp()  # Temporary disks saving
-            self._dump_tires_to_tmp()  # Temporary tires saving
+        # Another node parses the link and saves its output
+        is_lease_lost = self._lease_lost is not None and self._lease_lost.is_set()
+
+        if exc_type or not self._is_finished or is_lease_lost:
+            if exc_type:
+                logger.exception(f'Parser {self._id} — {exc_val}')
+            elif is_lease_lost:
+                logger.warning(f'Parser {self._id} — Lease of the link has been lost, output is not saved')
+            else:
+                logger.warning(f'Parser {self._id} — Items iteration has been stopped before the end')
+
+            self._checkpoint()  # Temporary records saving
+            self._frontier.close()
         else:
-            self._save_disks_to_xml()
-            self._save_tires_to_xml()
-            self._send_email_with_attachments()
+            if self._save_output_enabled:
+                started_at = time.process_time()
+                self._save_to_results_database()
+                self._save_output('disks', self._disks, self._disks_filename, self._save_disks_to_xml)
+                self._save_output('tires', self._tires, self._tires_filename, self._save_tires_to_xml)
+                self._save_columnar()
+                self._save_master_feed_spills()
+                self._cpu_seconds['output'] = time.process_time() - started_at
+
+            self._frontier.close()
+
+            if self._send_email_enabled:
+                self._send_email_with_attachments()
+
             rmtree(os.path.join(BASE_DIR, f'tmp/parser_{self._id}'))
 
-    def _refresh_session(self) -> None:
-        """ Closes current session and starts the new one """
+        logger.info(
+            f'Parser {self._id} — CPU seconds by stage: '
+            f'{", ".join(f"{stage} {seconds:.2f}" for stage, seconds in self._cpu_seconds.items())}'
+        )
+
+    def _refresh_session(self, discard_identity: bool = False) -> None:
+        """
+            Closes current session and starts the new one with the identity of the current proxy.
+            Args:
+                discard_identity: Remove the identity of the closed session from the vault instead of saving it
+        """
 
         logger.debug(f'Parser {self._id} — Refreshing session...')
 
+        if discard_identity:
+            self._vault.discard(self._identity)
+        else:
+            self._vault.save(self._identity)
+
         self._session.close()
         self._session = requests.Session()
+        self._use_identity(self._vault.acquire(self._proxy.id))
+
+    def _use_identity(self, identity: Identity) -> None:
+        """ Sets user-agent and cookies of the identity to the session """
+
+        logger.info(f'Parser {self._id} — Previous identity {self._identity}')
+
+        self._identity = identity
+        self._user_agent = identity.user_agent
+        self._user_headers['user-agent'] = identity.user_agent
+        self._script_headers['user-agent'] = identity.user_agent
+        self._session.cookies = identity.cookies
+
+    def _breaker(self, proxy: Proxy) -> CircuitBreaker:
+        """ Returns circuit breaker of the proxy """
+
+        return self._breakers.setdefault(proxy.id, CircuitBreaker())
 
     def _change_proxy(self) -> None:
-        """ Changes current proxy to the new one """
+        """ Changes current proxy to the new one, proxies with open circuit breaker are skipped if possible """
 
         logger.debug(f'Parser {self._id} — Changing proxy...')
 
         proxies = load_proxies()
         filtered = list(filter(lambda proxy: proxy != self._proxy, proxies))
 
-        self._proxy = random.choice(filtered)
+        if not filtered:
+            logger.warning(f'Parser {self._id} — No other proxies in input/proxies.csv, keeping proxy {self._proxy.id}')
+            return
+
+        available = list(filter(lambda proxy: not self._breaker(proxy).is_open, filtered))
+
+        if available:
+            self._proxy = random.choice(available)
+        else:  # All the breakers are open, take the proxy which has been open for the longest time
+            self._proxy = min(filtered, key=lambda proxy: self._breaker(proxy).opened_at)
+            logger.warning(f'Parser {self._id} — All the proxies are failing, using proxy {self._proxy.id}')
+
         self._proxies = self._proxies = {
             'http':
                 f'socks5://{self._proxy.username}:{self._proxy.password}@{self._proxy.ip}:{self._proxy.port_socks5}',
@@ -143,30 +326,15 @@ class Parser:
         }
 
     def _load_catalog_links(self) -> None:
-        """ Loads item links from file to parse items """
-
-        catalog_links_filename = os.path.join(BASE_DIR, f'tmp/parser_{self._id}/links')
+        """ Loads item links from the frontier or parses them from catalog if they have not been collected yet """
 
-        if os.path.exists(catalog_links_filename):
-            logger.debug(f'Parser {self._id} — loading catalog links...')
-            with open(catalog_links_filename, 'rb') as f:
-                self._links = pickle.load(f)
+        if self._frontier.is_complete:
+            logger.debug(f'Parser {self._id} — Loading catalog links... {len(self._frontier)} links')
         else:
-            self._parse_catalog_links()
-            self._dump_catalog_links()
+            self._frontier.clear()  # Collecting of the links has been interrupted in the previous launch
+            self._frontier.mark_complete(is_full_listing=self._parse_catalog_links())
 
-    def _dump_catalog_links(self) -> None:
-        """ Dumping item links into file to load them in next launch """
-
-        catalog_links_filename = os.path.join(BASE_DIR, f'tmp/parser_{self._id}/links')
-
-        if not os.path.exists(os.path.join(BASE_DIR, f'tmp/parser_{self._id}/')):
-            os.mkdir(os.path.join(BASE_DIR, f'tmp/parser_{self._id}/'))
-
-        if len(self._links):
-            logger.debug(f'Parser {self._id} — Dumping catalog links...')
-            with open(catalog_links_filename, 'wb') as f:
-                pickle.dump(self._links, f)
+        self._is_full_listing = self._frontier.is_full_listing
 
     def _load_tires_from_tmp_if_exists(self) -> None:
         """ Loads tires from temporary file if it exists """
@@ -197,9 +365,11 @@ class Parser:
 
         tmp_tires_filename = os.path.join(BASE_DIR, f'tmp/parser_{self._id}/tires')
 
-        with open(tmp_tires_filename, 'wb') as f:
+        # Write to a temporary file first not to lose the previous checkpoint if the process is killed while writing
+        with open(tmp_tires_filename + '.tmp', 'wb') as f:
             tires = [tire.__dict__() for tire in self._tires]
             pickle.dump(tires, f)
+        os.replace(tmp_tires_filename + '.tmp', tmp_tires_filename)
 
     def _dump_disks_to_tmp(self) -> None:
         """ Temporary dumps disks for further using after exception """
@@ -208,9 +378,21 @@ class Parser:
 
         tmp_disks_filename = os.path.join(BASE_DIR, f'tmp/parser_{self._id}/disks')
 
-        with open(tmp_disks_filename, 'wb') as f:
+        # Write to a temporary file first not to lose the previous checkpoint if the process is killed while writing
+        with open(tmp_disks_filename + '.tmp', 'wb') as f:
             disks = [disk.__dict__() for disk in self._disks]
             pickle.dump(disks, f)
+        os.replace(tmp_disks_filename + '.tmp', tmp_disks_filename)
+
+    def _checkpoint(self) -> None:
+        """ Dumps parsed records and the position in the frontier to continue from them after a crash """
+
+        self._dump_disks_to_tmp()
+        self._dump_tires_to_tmp()
+
+        # Items which are still being parsed are visited again after restart
+        oldest_pending = self._parse_pool.oldest_key
+        self._frontier.save_cursor(oldest_pending[0] if oldest_pending else None)
 
     def _save_tires_to_xml(self) -> None:
         """ Saves tires to xml output file """
@@ -229,6 +411,8 @@ class Parser:
 
             f.write('</products>')
 
+        self._output_filenames.append(self._tires_filename)
+
     def _save_disks_to_xml(self) -> None:
         """ Saves disks to xml output file """
 
@@ -246,6 +430,88 @@ class Parser:
 
             f.write('</products>')
 
+        self._output_filenames.append(self._disks_filename)
+
+    def _save_output(self, name: str, records: list[Tire | Disk], filename: str,
+                     save_full_output: Callable[[], None]) -> None:
+        """
+            Saves full output or, in delta mode, only items added, changed and removed since the previous run.
+            Full output is saved anyway on the first run and every DELTA_FULL_OUTPUT_EVERY_N_RUNS runs.
+        """
+
+        if not DELTA_MODE:
+            save_full_output()
+            return
+
+        snapshot = load_snapshot(self._id, name)
+        is_complete = self._is_complete and self._is_full_listing  # All the catalog items have been visited
+
+        if snapshot is None or snapshot.runs_since_full + 1 >= DELTA_FULL_OUTPUT_EVERY_N_RUNS:
+            save_full_output()
+            runs_since_full = 0
+        else:
+            delta = compute_delta(snapshot, records, is_complete=is_complete)
+            delta_filename = os.path.splitext(filename)[0] + '_delta.xml'
+
+            logger.debug(
+                f'Parser {self._id} — Saving {name} delta into output xml file: {len(delta.added)} added, '
+                f'{len(delta.changed)} changed, {len(delta.removed)} removed...'
+            )
+            save_delta_to_xml(delta_filename, delta)
+            self._output_filenames.append(delta_filename)
+            runs_since_full = snapshot.runs_since_full + 1
+
+        # Items which have not been visited because of the time budget or the incremental listing
+        # are kept from the previous snapshot
+        save_snapshot(self._id, name, records, runs_since_full, previous=None if is_complete else snapshot)
+
+    def _save_columnar(self) -> None:
+        """ Saves tires and disks to typed columnar output files """
+
+        if not COLUMNAR_EXPORT_FORMAT:
+            return
+
+        logger.debug(f'Parser {self._id} — Saving tires and disks into output columnar files...')
+
+        for records, record_type, filename in ((self._tires, Tire, self._tires_filename),
+                                               (self._disks, Disk, self._disks_filename)):
+            filename = save_columnar(
+                os.path.splitext(filename)[0], records, record_type, file_format=COLUMNAR_EXPORT_FORMAT
+            )
+            logger.debug(f'Parser {self._id} — {len(records)} records saved into {filename}')
+
+    def _save_master_feed_spills(self) -> None:
+        """ Saves tires and disks sorted by item id to be merged with the other links into the master feed """
+
+        if not MASTER_FEED:
+            return
+
+        logger.debug(f'Parser {self._id} — Saving tires and disks for the master feed...')
+
+        save_spill(self._id, 'tires', self._tires)
+        save_spill(self._id, 'disks', self._disks)
+
+    def _save_to_results_database(self) -> None:
+        """ Adds tires and disks of the run to the results database """
+
+        if not RESULTS_DATABASE:
+            return
+
+        logger.debug(f'Parser {self._id} — Saving tires and disks into the results database...')
+
+        database = ResultsDatabase(os.path.join(BASE_DIR, RESULTS_DATABASE))
+
+        try:
+            for records, record_type in ((self._tires, Tire), (self._disks, Disk)):
+                urls = {}
+                for record in records:
+                    path = self._frontier.path_of(record.item_id) if record.item_id else None
+                    urls[record.item_id] = urljoin('https://www.farpost.ru', path) if path else None
+
+                database.add(self._id, self._started_at, records, record_type, urls)
+        finally:
+            database.close()
+
     def _send_email_with_attachments(self):
         """ Sends an email with parsed .xml attachments """
 
@@ -253,10 +519,17 @@ class Parser:
 
         send_email_with_attachments(
             parsed_link=self._base_url,
-            paths=[self._disks_filename, self._tires_filename]
+            paths=self._output_filenames
         )
 
-    def _solve_captcha(self, url: str, hidden_s: str, hidden_t: str, image_url: str | None) -> requests.Response:
+    def _sleep(self, seconds: float, reason: str) -> None:
+        """ Deliberate delay, traced to tell it from the time spent on requests and parsing """
+
+        with span('sleep', reason=reason, seconds=seconds):
+            time.sleep(seconds)
+
+    @traced
+    def _solve_captcha(self, url: str, hidden_s: str, hidden_t: str, image_url: str | None) -> FarpostResponse:
         """
             Solves captcha.
             Args:
@@ -267,6 +540,7 @@ class Parser:
         """
 
         solver = TwoCaptcha(RUCAPTCHA_API_KEY)
+        self._identity.captchas += 1
 
         try:
             result = solver.recaptcha(sitekey=GOOGLE_SITE_KEY, url=url) \
@@ -284,18 +558,21 @@ class Parser:
                     'g-recaptcha-response': result['code']
                 },
                 proxies=self._proxies,
-                allow_redirects=True
+                allow_redirects=True,
+                timeout=self._timeout
             )
-            return response
+            self._bandwidth.record(self._proxy.id, 'captcha', response)
+            self._vault.save(self._identity)  # Clearance cookies for the other processes using the proxy
+            return FarpostResponse(response)
 
-    def _solve_captcha_if_captcha_in_response(self, response: requests.Response) -> Callable:
+    def _solve_captcha_if_captcha_in_response(self, response: FarpostResponse, request_type: str) -> Callable:
         """ Solves recaptcha if it presents in the response """
 
         requested_url = response.request.url  # The requested URL of the link to parse
         previous_captcha_type: CaptchaType = None
 
         def is_captcha() -> bool:
-            return is_captcha_in_response(response.text)
+            return is_captcha_in_response(response.content)  # No need to decode the body for the check
 
         def captcha_type() -> CaptchaType:
             return resolve_captcha_type(response.text)
@@ -309,7 +586,8 @@ class Parser:
             hidden_s, hidden_t, image_url = hidden_inputs()
             response = self._solve_captcha(url=response.url, hidden_s=hidden_s, hidden_t=hidden_t, image_url=image_url)
 
-        def inner() -> requests.Response:
+        @traced
+        def inner() -> FarpostResponse:
             nonlocal response, previous_captcha_type
 
             if not is_captcha():
@@ -328,7 +606,10 @@ class Parser:
 
                 if condition:  # Solve NORMAL captcha next
                     logger.debug(f'Parser {self._id} — Requesting captcha with type NORMAL')
-                    response = self._session.get(response.url + '&f=1')
+                    response = FarpostResponse(
+                        self._session.get(response.url + '&f=1', proxies=self._proxies, timeout=self._timeout)
+                    )
+                    self._bandwidth.record(self._proxy.id, 'captcha', response.raw_response)
                     logger.debug(f'Parser {self._id} — Solving second captcha... Captcha type {captcha_type()}')
                     resolve()
                 else:  # Solve RECAPTCHA next
@@ -341,195 +622,436 @@ class Parser:
                 logger.debug(f'Parser {self._id} — Captcha solved after 2nd attempt')
                 return response
 
-            self._refresh_session()
             self._change_proxy()
+            self._refresh_session(discard_identity=True)  # The cookies do not pass captcha
 
-            return self._request(requested_url)
+            return self._request(requested_url, request_type=request_type)
 
         return inner
 
-    def _request(self, url: str, is_script=False) -> requests.Response:
-        """ Makes a request to farpost.ru document """
+    @traced
+    def _request(self, url: str, is_script=False, request_type: str = 'item') -> FarpostResponse:
+        """
+            Makes a request to farpost.ru document.
+            Failed requests are retried by the policy of the error with exponential backoff,
+            failing proxies are replaced by the proxies with closed circuit breaker.
+            Args:
+                url: URL of the document
+                is_script: Send headers of a js request instead of a user one
+                request_type: Type of the request for the bandwidth report: catalog, feed, item or beacon
+        """
 
         headers = self._script_headers if is_script else self._user_headers
+        attempts = Counter()  # Attempts by error class
 
-        logger.debug(
-            f'Parser {self._id} — url {url} \n headers: {headers} \n proxies: {self._proxies}'
-        )
+        while True:
+            if self._lease_lost is not None and self._lease_lost.is_set():
+                raise LeaseLost(f'Lease of link {self._id} has been lost, the link is parsed by another node')
 
-        try:
-            response = self._session.get(
-                url=url,
-                proxies=self._proxies,
-                headers=headers
+            if self._heartbeat:
+                self._heartbeat.beat()
+
+            logger.debug(
+                f'Parser {self._id} — url {url} \n headers: {headers} \n proxies: {self._proxies}'
             )
 
-            return self._solve_captcha_if_captcha_in_response(response)()
-        except requests.exceptions.ConnectTimeout:
-            time.sleep(5)
-            self._request(url, is_script)
+            try:
+                with span('GET', url=url, request_type=request_type, proxy_id=self._proxy.id):
+                    response = FarpostResponse(
+                        self._session.get(
+                            url=url,
+                            proxies=self._proxies,
+                            headers=headers,
+                            timeout=self._timeout
+                        )
+                    )
+                self._bandwidth.record(self._proxy.id, request_type, response.raw_response)
+
+                if response.status_code >= 500:
+                    raise ServerError(f'{response.status_code} Server Error for url: {url}', response=response)
+            except RETRIABLE_ERRORS as e:
+                error_name, policy = resolve_retry_policy(e)
+                attempts[error_name] += 1
+
+                breaker = self._breaker(self._proxy)
+                if breaker.record_failure():
+                    self._retry_stats.trips[self._proxy.id] += 1
+                    logger.warning(f'Parser {self._id} — Circuit breaker of proxy {self._proxy.id} is open')
+
+                if attempts[error_name] >= policy.max_attempts:
+                    self._retry_stats.failures[error_name] += 1
+                    raise
+
+                self._retry_stats.retries[error_name] += 1
+                delay = backoff_delay(policy, attempts[error_name])
+                logger.warning(
+                    f'Parser {self._id} — {e!r}, retry {attempts[error_name]} of {policy.max_attempts - 1} in {delay:.1f}s'
+                )
+
+                if policy.change_proxy or breaker.is_open:
+                    self._change_proxy()
+                    self._refresh_session()
+
+                self._sleep(delay, 'retry')
+                continue
+
+            self._breaker(self._proxy).record_success()
+            self._identity.requests += 1
+
+            return self._solve_captcha_if_captcha_in_response(response, request_type)()
 
+    @traced
     def _mmy_request(self, query_params: dict):
         """ Makes a request to /mmy.txt with query parameters """
 
         url = 'https://www.farpost.ru/mmy.txt?' + urlencode(query_params)
-        self._request(url, is_script=True)
+        self._request(url, is_script=True, request_type='beacon')
+
+    def _parse_catalog_links(self) -> bool:
+        """
+            Parses all links from catalog (base_url).
+            In incremental mode stops after INCREMENTAL_LISTING_STOP_AFTER_N_KNOWN_PAGES consecutive pages
+            of the items seen by the previous runs unless the full listing is due.
+            Stops as well if the time budget is over, the listing is saved as an incremental one then.
+            Returns True if all the pages have been parsed.
+        """
+
+        history = ListingHistory(self._id)
+        is_full = not INCREMENTAL_LISTING or history.is_full_listing_due()
+        known_pages = 0  # Consecutive pages of known items
+
+        logger.debug(f'Parser {self._id} — {"Full" if is_full else "Incremental"} listing')
+
+        def add_page(content: str) -> None:
+            nonlocal known_pages
+
+            if LISTING_ONLY_MODE:  # Cards are compared with the indexed ones not to visit unchanged items
+                item_links = [
+                    (get_item_id(card.path), card.path, card.fingerprint) for card in get_cards_from_html(content)
+                ]
+            else:
+                item_links = [(get_item_id(link), link, None) for link in get_links_from_html(content)]
 
-    def _parse_catalog_links(self) -> None:
-        """ Parses all links from catalog (base_url) """
+            self._frontier.extend(item_links)
+            known_pages = known_pages + 1 if history.are_known([item_id for item_id, _, _ in item_links]) else 0
 
         logger.debug(f'Parser {self._id} — Requesting: {self._base_url}')
 
-        # First user request for page in browser
-        response = self._request(url=self._base_url)
+        with span('catalog_page', page=1):
+            # First user request for page in browser
+            response = self._request(url=self._base_url, request_type='catalog')
 
-        logger.debug(f'Parser {self._id} — Response: {response.text}')
+            logger.debug(f'Parser {self._id} — Response: {response.text}')
 
-        # Extract links from html
-        self._links.extend(
-            get_links_from_html(response.text)
-        )
+            # Extract links from html
+            add_page(response.text)
 
-        number_of_items, number_of_pages = get_number_of_items(response.text)
-        logger.debug(f'Parser {self._id} — Items: {number_of_items}, pages: {number_of_pages}')
+            number_of_items, number_of_pages = get_number_of_items(response.content)
+            logger.debug(f'Parser {self._id} — Items: {number_of_items}, pages: {number_of_pages}')
 
-        logger.debug(f'Parser {self._id} — Scroll delay')
+            logger.debug(f'Parser {self._id} — Scroll delay')
 
-        # Scroll delay
-        time.sleep(random.randint(15, 20))
+            # Scroll delay
+            self._sleep(random.randint(15, 20), 'scroll')
 
         for i in range(2, number_of_pages + 1):
-            url = self._base_url + f'?_lightweight=1&ajax=1&async=1&city=0&page={i}&status=actual'
-            logger.debug(f'Parser {self._id} — Requesting: {url}')
+            if not is_full and known_pages >= INCREMENTAL_LISTING_STOP_AFTER_N_KNOWN_PAGES:
+                logger.info(
+                    f'Parser {self._id} — Pages {i - known_pages}-{i - 1} contain only known items, '
+                    f'{number_of_pages - i + 1} of {number_of_pages} pages are skipped'
+                )
+                break
 
-            response = self._request(url, is_script=True)
+            # A page takes up to 20 seconds of scroll delay, it is not listed if no item can be parsed after it
+            if not self._scheduler.has_time_for(20 + self._scheduler.seconds_per_item):
+                logger.warning(
+                    f'Parser {self._id} — Time budget is over, {number_of_pages - i + 1} of {number_of_pages} pages '
+                    f'are not listed'
+                )
+                is_full = False  # Saved as an incremental listing, so the unlisted items are not considered removed
+                break
 
-            logger.debug(f'Parser {self._id} — Response: {response.text}')
+            with span('catalog_page', page=i):
+                url = self._base_url + f'?_lightweight=1&ajax=1&async=1&city=0&page={i}&status=actual'
+                logger.debug(f'Parser {self._id} — Requesting: {url}')
 
-            # Extract links from json
-            self._links.extend(
-                get_links_from_html(response.json()['feed'])
-            )
+                response = self._request(url, is_script=True, request_type='feed')
 
-            timestamp = int(time.time())
+                logger.debug(f'Parser {self._id} — Response: {response.text}')
 
-            self._mmy_request(
-                query_params={
-                    'action': 'viewdir_ppc_good_show__in_0',
-                    'keyName': '0__rel_0',
-                    '_': timestamp
-                }
-            )
+                # Extract links from json
+                add_page(response.json()['feed'])
 
-            time.sleep(1)
+                timestamp = int(time.time())
 
-            self._mmy_request(
-                query_params={
-                    'action': 'page_clicked',
-                    'keyName': i,
-                    '_': timestamp + 1
-                }
-            )
+                self._mmy_request(
+                    query_params={
+                        'action': 'viewdir_ppc_good_show__in_0',
+                        'keyName': '0__rel_0',
+                        '_': timestamp
+                    }
+                )
 
-            self._script_headers['referer'] = self._base_url + f'?page={i}'
+                self._sleep(1, 'beacon')
 
-            logger.debug(f'Parser {self._id} — Scroll delay')
+                self._mmy_request(
+                    query_params={
+                        'action': 'page_clicked',
+                        'keyName': i,
+                        '_': timestamp + 1
+                    }
+                )
 
-            # Scroll delay
-            time.sleep(random.randint(15, 20))
+                self._script_headers['referer'] = self._base_url + f'?page={i}'
 
-    def _parse_catalog_items(self):
-        """ Parses disks and tires from each link in self._links """
+                logger.debug(f'Parser {self._id} — Scroll delay')
 
-        # If there is an item to start parse
-        if self._from_link:
-            from_item_index = self._links.index(self._from_link)
-            links = self._links[from_item_index:]
+                # Scroll delay
+                self._sleep(random.randint(15, 20), 'scroll')
         else:
-            from_item_index = None
-            links = self._links
+            is_full = True  # All the pages have been visited
 
-        total_links = len(self._links)
+        try:
+            history.save((item_id for _, item_id, _ in self._frontier.iter_items()), is_full=is_full)
+        finally:
+            history.close()
 
-        for i, link in enumerate(links, start=from_item_index if from_item_index else 0):
-            item_page = math.ceil((i + 1) / 50)  # Number of page where current item located
-            self._user_headers['referer'] = self._base_url + f'?page={item_page}'
-            self._script_headers['referer'] = urljoin(self._base_url, link)
+        return is_full
 
-            logger.debug(f'Parser {self._id} — Requesting: {i + 1} / {total_links} {link}')
-            response = self._request('https://www.farpost.ru' + link)
+    def _submit_item_page(self, n: int, item_id: str, link: str, response: FarpostResponse,
+                          card_fingerprint: str | None = None) -> Generator[Tire | Disk, None, None]:
+        """
+            Passes item page to the parse pool or the indexed record if the bulletin body has not changed
+            since it was parsed, adds and yields the items parsed so far.
+            Args:
+                n: Number of the item in the visit order
+                item_id: Id of the item
+                link: Path of the item page
+                response: Response with the item page
+                card_fingerprint: Fingerprint of the catalog card of the item in listing-only mode
+        """
 
-            timestamp = int(time.time())
-            item_id = get_item_id(link)
-            item_type = resolve_item_type(response.text)
+        fingerprint = fingerprint_item_page(response.text)  # The same text is quarantined and reparsed
+        indexed = self._item_index.get(item_id)
 
-            logger.debug(f'Parser {self._id} — Item id: {item_id}, item type: {item_type}, item page: {item_page}')
+        if fingerprint and indexed and indexed.fingerprint == fingerprint:
+            logger.debug(f'Parser {self._id} — Item {item_id} has not changed since the last parsing')
 
-            try:
-                query_params = {
-                    'action': 'viewdir_item_click',
-                    'briefType': 'inline',
-                    'searchPos': i + 1,
-                    'accuracy': 'exact',
-                    'bullId': item_id,
-                    '_': timestamp,
-                    **get_item_params_for_mmy_request(response.text)
-                }
-            except IndexError:  # No item on the requested page (has been deleted or replaced)
+            self._item_index.touch(item_id, card_fingerprint=card_fingerprint)
+            self._index_hits += 1
+            self._parse_seconds_saved += indexed.parse_seconds
+
+            record = indexed.record.__dict__() if indexed.record is not None else None
+            yield from self._add_parsed_items(
+                self._parse_pool.put((n, item_id, None, None, None, None), ((indexed.item_type, record, 0.0, None), []))
+            )
+        else:
+            # The page is kept with the task to quarantine it if the extraction fails,
+            # spans of the extractors are returned with the result if the item is traced
+            yield from self._add_parsed_items(
+                self._parse_pool.submit(
+                    (n, item_id, fingerprint, card_fingerprint, link, response.text),
+                    traced_call, tracing.is_sampled(), parse_item_page, response.text, item_id
+                )
+            )
+
+    def _quarantine_item(self, item_id: str, link: str, content: str, error: str) -> None:
+        """ Quarantines the item page which extraction has failed, the crawl continues without it """
+
+        logger.error(f'Parser {self._id} — Item {item_id} has been quarantined: {error}')
+
+        self._quarantine.put(item_id, self._id, link, content, error)
+        self._quarantined += 1
+        self._is_complete = False  # The item is kept from the previous snapshot in delta mode
+
+    def _add_parsed_items(self, parsed_items: Iterable[tuple[tuple, tuple]]) -> Generator[Tire | Disk, None, None]:
+        """
+            Adds parsed items returned by the parse pool in the visit order to the records and the index,
+            yields the added tires and disks.
+            Pages which extraction has failed are quarantined and the crawl continues without them.
+        """
+
+        for key, ((item_type, record, parse_seconds, error), events) in parsed_items:
+            n, item_id, fingerprint, card_fingerprint, link, content = key
+            started_at = time.process_time()
+            self._cpu_seconds['parse'] += parse_seconds
+            tracing.add_events(events, item_id=item_id, n=n)
+
+            if error:
+                self._quarantine_item(item_id, link, content, error)
+                self._cpu_seconds['collect'] += time.process_time() - started_at
                 continue
 
-            self._mmy_request(query_params)
+            record = SCHEMAS[item_type].record.from_dict(record) if record is not None else None
 
-            time.sleep(1)
-            self._mmy_request(
-                query_params={
-                    'action': 'viewbull_similar_block_bottom__exists',
-                    'keyName': 'not_show',
-                    '_': timestamp + 1
-                }
-            )
+            if fingerprint:  # Has been parsed, not taken from the index
+                self._item_index.put(item_id, fingerprint, item_type, record, parse_seconds, card_fingerprint)
 
-            time.sleep(1)
-            self._mmy_request(
-                query_params={
-                    'action': 'viewbull_ask_button_is_visible',
-                    '_': timestamp + 2
-                }
-            )
+            logger.debug(f'Parser {self._id} — Item id: {item_id}, item type: {item_type}')
 
             match item_type:
                 case ItemType.TIRE:
-                    tire = parse_tire(response.text)
-                    logger.debug(f'Parser {self._id} — Parsed tire: {tire}')
-                    self._tires.append(tire)
+                    logger.debug(f'Parser {self._id} — Parsed tire: {record}')
+                    self._tires.append(record)
 
                 case ItemType.DISK:
-                    disk = parse_disk(response.text)
-                    logger.debug(f'Parser {self._id} — Parsed disk: {disk}')
-                    self._disks.append(disk)
+                    logger.debug(f'Parser {self._id} — Parsed disk: {record}')
+                    self._disks.append(record)
                 case _:
                     logger.debug(f'Parser {self._id} — Not a disk or a tire.')
 
-            if bool(random.getrandbits(1)):  # Random choice whether to scroll page to bottom
-                logger.debug(f'Parser {self._id} — Scroll delay')
+            self._cpu_seconds['collect'] += time.process_time() - started_at
 
-                # Scroll delay
-                time.sleep(random.randint(1, 10))
+            if record is not None:
+                yield record
+
+    def _parse_catalog_items(self) -> Generator[Tire | Disk, None, None]:
+        """
+            Parses disks and tires from each link in the frontier.
+            New items are parsed first, then the items which have not been seen for the longest time.
+            Stops when the next item is not expected to be parsed within the time budget.
+            The order is kept in the frontier, so the next launch continues from the item it has stopped on.
+        """
+
+        total_links = len(self._frontier)
+
+        if not self._frontier.has_order:
+            # If there is an item to start parse
+            from_position = self._frontier.position_of(get_item_id(self._from_link)) if self._from_link else 0
+            assert from_position is not None, f'{self._from_link} is not in the catalog'
+
+            # Ordered in SQLite, so the catalog is not loaded into memory
+            self._frontier.set_order(self._item_index.filename, from_position)
+
+        visited = self._frontier.cursor
+        number_of_items = visited + self._frontier.count_pending()
+        self._scheduler.set_number_of_items(number_of_items, visited)
+        parsed: list[Tire | Disk] = []  # Yielded after the span of the item is closed not to trace the consumer in it
+
+        for n, (i, item_id, link, card_fingerprint) in enumerate(self._frontier.iter_pending(), start=visited):
+            yield from parsed  # Previous item
+            parsed.clear()
+
+            self._scheduler.finish_item()  # Previous item
+
+            if n > visited and n % CHECKPOINT_EVERY_N_ITEMS == 0:
+                self._checkpoint()  # The previous items are done, the cursor is on the current one
+
+            with span('item', item_id=item_id, n=n):
+                indexed = self._item_index.get(item_id) if card_fingerprint else None
+
+                if indexed and indexed.card_fingerprint == card_fingerprint:
+                    logger.debug(f'Parser {self._id} — Catalog card of item {item_id} has not changed')
+
+                    self._item_index.touch(item_id)
+                    self._card_hits += 1
+
+                    record = indexed.record.__dict__() if indexed.record is not None else None
+                    parsed.extend(
+                        self._add_parsed_items(
+                            self._parse_pool.put(
+                                (n, item_id, None, None, None, None), ((indexed.item_type, record, 0.0, None), [])
+                            )
+                        )
+                    )
+                    continue
+
+                if not self._scheduler.has_time_for_next_item():
+                    logger.warning(
+                        f'Parser {self._id} — Time budget is over, {number_of_items - n} items have not been parsed'
+                    )
+                    self._is_complete = False
+                    break
 
+                self._scheduler.start_item()
+
+                item_page = math.ceil((i + 1) / 50)  # Number of page where current item located
+                self._user_headers['referer'] = self._base_url + f'?page={item_page}'
+                self._script_headers['referer'] = urljoin(self._base_url, link)
+
+                logger.debug(
+                    f'Parser {self._id} — Requesting: {n + 1} / {number_of_items} '
+                    f'(#{i + 1} of {total_links} in catalog) {link}, ETA: {self._scheduler.eta(number_of_items - n)}'
+                )
+                response = self._request('https://www.farpost.ru' + link)
+
+                timestamp = int(time.time())
+
+                try:
+                    query_params = {
+                        'action': 'viewdir_item_click',
+                        'briefType': 'inline',
+                        'searchPos': i + 1,
+                        'accuracy': 'exact',
+                        'bullId': item_id,
+                        '_': timestamp,
+                        **get_item_params_for_mmy_request(response.text)
+                    }
+                except IndexError:  # No item on the requested page (has been deleted or replaced)
+                    continue
+                except Exception:  # Malformed item parameters
+                    self._quarantine_item(item_id, link, response.text, traceback.format_exc())
+                    continue
+
+                parsed.extend(self._submit_item_page(n, item_id, link, response, card_fingerprint))
+
+                self._mmy_request(query_params)
+
+                self._sleep(1, 'beacon')
                 self._mmy_request(
                     query_params={
-                        'action': 'viewbull_similar_block_bottom__show',
+                        'action': 'viewbull_similar_block_bottom__exists',
                         'keyName': 'not_show',
-                        '_': int(time.time())
+                        '_': timestamp + 1
                     }
                 )
 
-            logging.debug(f'Parser {self._id} — Delay after product watching.')
+                self._sleep(1, 'beacon')
+                self._mmy_request(
+                    query_params={
+                        'action': 'viewbull_ask_button_is_visible',
+                        '_': timestamp + 2
+                    }
+                )
+
+                if bool(random.getrandbits(1)):  # Random choice whether to scroll page to bottom
+                    logger.debug(f'Parser {self._id} — Scroll delay')
+
+                    # Scroll delay
+                    self._sleep(random.randint(1, 10), 'scroll')
+
+                    self._mmy_request(
+                        query_params={
+                            'action': 'viewbull_similar_block_bottom__show',
+                            'keyName': 'not_show',
+                            '_': int(time.time())
+                        }
+                    )
+
+                logging.debug(f'Parser {self._id} — Delay after product watching.')
+
+                # Delay after product watching
+                self._sleep(random.randint(1, 10), 'product_watching')
+
+        yield from parsed  # Last item
+        self._scheduler.finish_item()  # Last item
+        yield from self._add_parsed_items(self._parse_pool.drain())
+
+        self._is_finished = True
+
+    def iter_items(self) -> Generator[Tire | Disk, None, None]:
+        """
+            Parses catalog items and yields tires and disks with their item ids as soon as they are parsed.
+            The next item is not requested until the previous ones are taken.
+            Records loaded from the checkpoint of the previous launch are not yielded again.
+            If the iteration is stopped before all the items are parsed, the parser saves a checkpoint on exit
+            instead of the output.
+        """
 
-            # Delay after product watching
-            time.sleep(random.randint(1, 10))
+        yield from self._parse_catalog_items()
 
     def run(self):
         """ Starts parser """
 
-        self._parse_catalog_items()
+        for _ in self.iter_items():
+            pass
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from core.settings import BASE_DIR, RESULTS_DATABASE
+from helpers.parse_html import Tire, Disk
+from helpers.results_db import ResultsDatabase
+
+
+# Tire size: "265/65 R17", "265/65R17", "265/65/17"
+_TIRE_SIZE_REGEX = re.compile(r'^(\d+(?:[.,]\d+)?)\s*/\s*(\d+(?:[.,]\d+)?)\s*[/RrРр]*\s*(\d+(?:[.,]\d+)?)$')
+
+# PCD: "5x114.3", "5х114,3" (cyrillic), "4*100"
+_PCD_REGEX = re.compile(r'^(\d+)\s*[xхXХ×*]\s*(\d+(?:[.,]\d+)?)$')
+
+
+def _number(value: str) -> float:
+    return float(value.replace(',', '.'))
+
+
+def tire_conditions(namespace: argparse.Namespace) -> list[tuple[str, str, object]]:
+    """ Returns conditions of the tires query """
+
+    conditions = []
+
+    if namespace.size:
+        match = _TIRE_SIZE_REGEX.match(namespace.size.strip())
+        assert match, f'Tire size {namespace.size} must be like 265/65R17'
+
+        width, height, diameter = map(_number, match.groups())
+        conditions += [
+            ('landing_diameter', '=', diameter),
+            ('profile_width', '=', width),
+            ('profile_height', '=', height)
+        ]
+
+    if namespace.diameter:
+        conditions.append(('landing_diameter', '=', namespace.diameter))
+
+    return conditions
+
+
+def disk_conditions(namespace: argparse.Namespace) -> list[tuple[str, str, object]]:
+    """ Returns conditions of the disks query """
+
+    conditions = []
+
+    if namespace.diameter:
+        conditions.append(('diameter', '=', namespace.diameter))
+
+    if namespace.pcd:
+        match = _PCD_REGEX.match(namespace.pcd.strip())
+        assert match, f'PCD {namespace.pcd} must be like 5x114.3'
+
+        conditions += [
+            ('pcd_holes', '=', int(match.group(1))),
+            ('pcd_diameter', '=', _number(match.group(2)))
+        ]
+
+    return conditions
+
+
+def main():
+    """ Prints records of the results database matching the query as csv """
+    args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description='Query tires and disks parsed from FarPost.ru')
+    subparsers = parser.add_subparsers(dest='record_type', required=True)
+
+    tires = subparsers.add_parser('tires', help='Query tires')
+    tires.add_argument('--size', type=str, help='Tire size: width/height R diameter, e.g. 265/65R17')
+    tires.add_argument('--diameter', type=float, help='Landing diameter')
+
+    disks = subparsers.add_parser('disks', help='Query disks')
+    disks.add_argument('--diameter', type=float, help='Disk diameter')
+    disks.add_argument('--pcd', type=str, help='Drilling PCD, e.g. 5x114.3')
+
+    for subparser in (tires, disks):
+        subparser.add_argument('--min-price', type=float)
+        subparser.add_argument('--max-price', type=float)
+        subparser.add_argument('--availability', type=str, help='Substring of the availability, e.g. "В наличии"')
+        subparser.add_argument('--link-id', type=str, help='Link id from input/links.csv, i.e. the seller')
+        subparser.add_argument('--since', type=datetime.fromisoformat, help='Crawled since the date, e.g. 2023-01-01')
+        subparser.add_argument('--history', action='store_true',
+                               help='Records of all the runs, only the last crawled record of each item by default')
+        subparser.add_argument('--limit', type=int, default=100, help='Maximum number of records, 0 for no limit')
+
+    namespace = parser.parse_args(args)
+
+    if not RESULTS_DATABASE or not os.path.exists(os.path.join(BASE_DIR, RESULTS_DATABASE)):
+        print('The results database does not exist, it is filled by the parser runs', file=sys.stderr)
+        sys.exit(1)
+
+    record_type = Tire if namespace.record_type == 'tires' else Disk
+    conditions = tire_conditions(namespace) if record_type is Tire else disk_conditions(namespace)
+
+    if namespace.min_price is not None:
+        conditions.append(('price', '>=', namespace.min_price))
+    if namespace.max_price is not None:
+        conditions.append(('price', '<=', namespace.max_price))
+    if namespace.availability:
+        conditions.append(('availability', 'LIKE', f'%{namespace.availability}%'))
+    if namespace.link_id:
+        conditions.append(('link_id', '=', namespace.link_id))
+    if namespace.since:
+        conditions.append(('crawled_at', '>=', namespace.since.timestamp()))
+
+    database = ResultsDatabase(os.path.join(BASE_DIR, RESULTS_DATABASE))
+    started_at = time.perf_counter()
+
+    try:
+        names, rows = database.find(record_type, conditions, latest=not namespace.history, limit=namespace.limit)
+    finally:
+        database.close()
+
+    elapsed = time.perf_counter() - started_at
+    crawled_at = names.index('crawled_at')
+
+    writer = csv.writer(sys.stdout, delimiter=';')
+    writer.writerow(names)
+    for row in rows:
+        row = list(row)
+        row[crawled_at] = datetime.fromtimestamp(row[crawled_at]).strftime('%Y-%m-%d %H:%M')
+        writer.writerow(row)
+
+    print(f'{len(rows)} records in {elapsed * 1000:.1f} ms', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urljoin
+from core.settings import BASE_DIR, RESULTS_DATABASE
+from helpers.item_index import ItemIndex
+from helpers.parse_html import SCHEMAS, Tire, Disk, fingerprint_item_page, parse_item_page
+from helpers.quarantine import Quarantine
+from helpers.results_db import ResultsDatabase
+
+
+def save_to_xml(filename: str, records: list[Tire | Disk]) -> None:
+    with open(filename, 'w') as f:
+        f.write(
+            """<?xml version="1.0" encoding="UTF-8"?>
+                <products>
+            """
+        )
+
+        for record in records:
+            f.write(record.to_xml())
+
+        f.write('</products>')
+
+
+def main():
+    """
+        Runs the extractors over the quarantined item pages again without requests to FarPost.ru.
+        Parsed items are added to the item index and the results database, saved to output xml files
+        and removed from the quarantine, the items which still fail stay there.
+    """
+    args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description='Parse quarantined item pages again after a fix of the extractors')
+    parser.add_argument('--link-id', type=str, help='Reparse items of the link only (id from input/links.csv)')
+    namespace = parser.parse_args(args)
+
+    quarantine = Quarantine()
+    item_index = ItemIndex()
+    database = ResultsDatabase(os.path.join(BASE_DIR, RESULTS_DATABASE)) if RESULTS_DATABASE else None
+
+    records: dict[tuple[str, type], list[Tire | Disk]] = defaultdict(list)  # Parsed records by link and type
+    failed = skipped = 0
+
+    try:
+        for item in quarantine.iter_items(namespace.link_id):
+            item_type, record, parse_seconds, error = parse_item_page(item.content, item.item_id)
+
+            if error:
+                print(f'Item {item.item_id} still fails: {error.strip().splitlines()[-1]}', file=sys.stderr)
+                failed += 1
+                continue
+
+            record = SCHEMAS[item_type].record.from_dict(record) if record is not None else None
+            fingerprint = fingerprint_item_page(item.content)
+
+            if fingerprint:  # The next run does not parse the page again if it has not changed
+                item_index.put(item.item_id, fingerprint, item_type, record, parse_seconds)
+
+            if record is None:  # Not a tire or a disk
+                skipped += 1
+            else:
+                records[(item.link_id, type(record))].append(record)
+
+                if database is not None:
+                    url = urljoin('https://www.farpost.ru', item.path)
+                    database.add(item.link_id, item.quarantined_at, [record], type(record), {item.item_id: url})
+
+            quarantine.remove(item.item_id)
+    finally:
+        quarantine.close()
+        item_index.close()
+        if database is not None:
+            database.close()
+
+    now = datetime.now().strftime('%Y-%m-%d_%H-%M')
+    os.makedirs(os.path.join(BASE_DIR, 'output'), exist_ok=True)
+
+    for (link_id, record_type), link_records in sorted(records.items(), key=lambda item: item[0][0]):
+        name = 'tires' if record_type is Tire else 'disks'
+        filename = os.path.join(BASE_DIR, f'output/{link_id}_{now}_reparsed_{name}.xml')
+
+        save_to_xml(filename, link_records)
+        print(f'{len(link_records)} {name} of link {link_id} saved to {filename}', file=sys.stderr)
+
+    print(
+        f'{sum(map(len, records.values()))} items parsed, {skipped} are not tires or disks, {failed} still fail',
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()